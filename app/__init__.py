@@ -0,0 +1,3 @@
+from .startup import startup_profile
+
+startup_profile.install_import_timer()
@@ -4,22 +4,25 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import jwt
-from fastapi import HTTPException, Request, status
+from fastapi import Depends, HTTPException, Request, status
 
 from .settings import ADMIN_JWT_SECRET
+from .silos import Silo, get_silo
 
 SECRET_KEY = ADMIN_JWT_SECRET
 ALGORITHM = "HS256"
 
 
-def create_admin_token(sub: str, expires_minutes: int = 60) -> str:
+def create_admin_token(sub: str, silo_id: str, expires_minutes: int = 60) -> str:
     now = datetime.now(timezone.utc)
     expire = now + timedelta(minutes=expires_minutes)
-    payload = {"sub": sub, "exp": expire, "iat": now, "role": "admin"}
+    # One process serves many silos with one secret: the token names the silo
+    # it was issued for, so it can't be replayed against another silo.
+    payload = {"sub": sub, "exp": expire, "iat": now, "role": "admin", "silo": silo_id}
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_admin(request: Request) -> str:
+async def get_current_admin(request: Request, silo: Silo = Depends(get_silo)) -> str:
     token: Optional[str] = request.cookies.get("admin_session")
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated as admin.")
@@ -32,4 +35,7 @@ def get_current_admin(request: Request) -> str:
     if payload.get("role") != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized.")
 
+    if payload.get("silo") != silo.id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Admin session is for another silo.")
+
     return str(payload["sub"])
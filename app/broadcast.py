@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from . import models, schemas
+from .database import SessionLocal
+from .feed_cache import FeedCache, feed_cache
+from .pagination import Cursor, decode_cursor, encode_cursor
+from .settings import DATABASE_URL, FEED_STREAM_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "song_feed"
+# Postgres caps NOTIFY payloads at 8000 bytes; bigger entries are sent by id.
+NOTIFY_MAX_PAYLOAD = 7500
+
+# (cursor, SSE frame) pairs; None tells a subscriber it was dropped.
+FeedEvent = tuple[Cursor, str]
+
+
+def sse_frame(cursor: str, data: str) -> str:
+    return f"event: song\nid: {cursor}\ndata: {data}\n\n"
+
+
+def song_event(entry: models.SongEntry) -> tuple[str, str]:
+    return encode_cursor(entry.created_at, entry.id), schemas.SongOut.model_validate(entry).model_dump_json()
+
+
+class SongBroadcaster:
+    """
+    Fans new SongEntry rows out to streaming clients.
+
+    Each subscriber gets a bounded queue; one that falls behind is dropped so
+    it reconnects and resumes from Last-Event-ID instead of stalling the
+    rest. On Postgres, events travel through LISTEN/NOTIFY so a write on any
+    worker reaches clients on every worker; otherwise they stay in-process.
+    """
+
+    def __init__(
+        self,
+        queue_size: int,
+        pg_url: str | None,
+        session_factory: async_sessionmaker,
+        feed_cache: FeedCache,
+    ):
+        self.queue_size = queue_size
+        self._pg_url = pg_url
+        self._session_factory = session_factory
+        self._feed_cache = feed_cache
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def _deliver(self, cursor: str, data: str) -> None:
+        event: FeedEvent = (decode_cursor(cursor), sse_frame(cursor, data))
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+                # Make room for the close marker; the client resyncs on reconnect.
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def publish(self, entries: list[models.SongEntry]) -> None:
+        events = [song_event(entry) for entry in entries]
+        if self._pg_url is None:
+            for cursor, data in events:
+                self._deliver(cursor, data)
+            return
+
+        payloads = []
+        for (cursor, data), entry in zip(events, entries):
+            payload = json.dumps({"id": cursor, "data": data})
+            if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+                payload = json.dumps({"id": cursor, "entry_id": entry.id})
+            payloads.append(payload)
+        async with self._session_factory() as db:
+            for payload in payloads:
+                await db.execute(
+                    text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload}
+                )
+            await db.commit()
+
+    async def _load_entry(self, entry_id: int) -> models.SongEntry | None:
+        async with self._session_factory() as db:
+            return await db.scalar(select(models.SongEntry).where(models.SongEntry.id == entry_id))
+
+    async def _on_notify(self, payload: str) -> None:
+        # Any new entry, from any worker, makes cached /songs bodies stale.
+        self._feed_cache.invalidate()
+        message = json.loads(payload)
+        if "data" in message:
+            self._deliver(message["id"], message["data"])
+            return
+        entry = await self._load_entry(message["entry_id"])
+        if entry is not None:
+            self._deliver(*song_event(entry))
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self._pg_url, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    delay = 1.0
+                    async for notify in conn.notifies():
+                        try:
+                            await self._on_notify(notify.payload)
+                        except Exception:
+                            logger.exception("Bad song feed notification")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Song feed listener disconnected; retrying in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def start(self) -> None:
+        if self._pg_url is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queue in list(self._subscribers):
+            self._subscribers.discard(queue)
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+def libpq_url(database_url: str) -> str | None:
+    url = make_url(database_url)
+    if url.drivername.split("+", 1)[0] not in ("postgres", "postgresql"):
+        return None
+    # psycopg wants a plain libpq URL, without the SQLAlchemy driver suffix.
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+broadcaster = SongBroadcaster(
+    queue_size=FEED_STREAM_QUEUE_SIZE,
+    pg_url=libpq_url(DATABASE_URL) if DATABASE_URL else None,
+    session_factory=SessionLocal,
+    feed_cache=feed_cache,
+)
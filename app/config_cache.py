@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from .settings import CONFIG_CACHE_CHECK_SECONDS
+
+
+@dataclass(frozen=True, slots=True)
+class PlaylistConfigSnapshot:
+    """Read-only copy of the playlist_config row, safe to share across requests."""
+    id: int
+    version: int
+    spotify_playlist_id: str | None
+    spotify_connected: bool
+    name: str | None
+    description: str | None
+    cover_image_url: str | None
+
+
+_UNLOADED = object()
+
+
+class ConfigCache:
+    """
+    In-process cache of the single playlist_config row.
+
+    Local admin writes call invalidate(). Writes from other workers are picked
+    up by comparing playlist_config.version, at most every `check_interval`
+    seconds, so steady-state reads do no DB work at all.
+
+    The cached version never goes backwards: a read from a lagging replica
+    that finds an older row keeps the newer snapshot.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        # (snapshot, checked_at) swapped atomically; no lock needed.
+        self._state: tuple[object, float] = (_UNLOADED, 0.0)
+
+    def invalidate(self) -> None:
+        self._state = (_UNLOADED, 0.0)
+
+    async def get(self, db: AsyncSession, max_age: float | None = None) -> PlaylistConfigSnapshot | None:
+        """`max_age` overrides check_interval (0: always check the version)."""
+        snapshot, checked_at = self._state
+        now = time.monotonic()
+        max_age = self.check_interval if max_age is None else max_age
+        if snapshot is not _UNLOADED and now - checked_at < max_age:
+            return snapshot
+
+        if snapshot is not _UNLOADED:
+            version = await crud.get_playlist_config_version(db)
+            cached_version = snapshot.version if snapshot is not None else None
+            # Same version, or an older one (a lagging replica): keep ours.
+            if version == cached_version or (None not in (version, cached_version) and version < cached_version):
+                self._state = (snapshot, now)
+                return snapshot
+
+        row = await crud.get_playlist_config_row(db)
+        snapshot = None if row is None else PlaylistConfigSnapshot(
+            id=row.id,
+            version=row.version,
+            spotify_playlist_id=row.spotify_playlist_id,
+            spotify_connected=bool(row.spotify_refresh_token),
+            name=row.name,
+            description=row.description,
+            cover_image_url=row.cover_image_url,
+        )
+        self._state = (snapshot, now)
+        return snapshot
+
+
+config_cache = ConfigCache(check_interval=CONFIG_CACHE_CHECK_SECONDS)
@@ -1,43 +1,423 @@
 from __future__ import annotations
 
-from sqlalchemy.orm import Session
+import functools
+from collections import Counter
+from datetime import datetime
+
+from typing import AsyncIterator, NamedTuple
+
+from sqlalchemy import Integer, Row, Select, bindparam, cast, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from . import models
+from .pagination import Cursor
 
 
-def get_playlist_config(db: Session) -> models.PlaylistConfig | None:
-    return db.query(models.PlaylistConfig).first()
+async def get_playlist_config(db: AsyncSession) -> models.PlaylistConfig | None:
+    return await db.scalar(select(models.PlaylistConfig).limit(1))
 
 
-def ensure_playlist_config_row(db: Session) -> models.PlaylistConfig:
-    cfg = get_playlist_config(db)
+async def ensure_playlist_config_row(db: AsyncSession) -> models.PlaylistConfig:
+    cfg = await get_playlist_config(db)
     if cfg is not None:
         return cfg
     cfg = models.PlaylistConfig()
     db.add(cfg)
-    db.commit()
-    db.refresh(cfg)
+    await db.commit()
+    await db.refresh(cfg)
     return cfg
 
 
-def list_songs(db: Session) -> list[models.SongEntry]:
+def bump_playlist_config_version(cfg: models.PlaylistConfig) -> None:
+    # SQL-side increment, so concurrent writers can't lose a bump.
+    cfg.version = models.PlaylistConfig.version + 1
+
+
+def _songs_since_stmt(after: Cursor, limit: int, *entities):
     return (
-        db.query(models.SongEntry)
-        .order_by(models.SongEntry.created_at.desc())
-        .all()
+        select(*entities)
+        .where(tuple_(models.SongEntry.created_at, models.SongEntry.id) > tuple_(*after))
+        .order_by(models.SongEntry.created_at.asc(), models.SongEntry.id.asc())
+        .limit(limit)
     )
 
 
-def find_song_by_user_and_track(db: Session, user: str, spotify_track_id: str) -> models.SongEntry | None:
-    return (
-        db.query(models.SongEntry)
-        .filter(models.SongEntry.user == user, models.SongEntry.spotify_track_id == spotify_track_id)
-        .first()
+async def list_songs_since(db: AsyncSession, after: Cursor, limit: int) -> list[models.SongEntry]:
+    """Oldest first, strictly newer than `after`, so pollers can walk forward."""
+    return list(await db.scalars(_songs_since_stmt(after, limit, models.SongEntry)))
+
+
+# ---------- Hot paths: prebuilt statements, plain rows ----------
+# These run on every request (or every cache check), so their statements are
+# built once, with bindparam() placeholders: executing the same statement
+# object skips construction and cache-key generation (the key is memoized on
+# it) and reuses the engine's compiled form. They select explicit Table
+# columns on the session's connection, so rows come back as plain tuples
+# without going through the ORM. Use the ORM functions above to mutate.
+
+_songs = models.SongEntry.__table__
+_playlist_config = models.PlaylistConfig.__table__
+_feed_state = models.FeedState.__table__
+
+_FEED_VERSION_STMT = select(_feed_state.c.version).where(_feed_state.c.id == models.FEED_STATE_ID)
+_PLAYLIST_CONFIG_VERSION_STMT = select(_playlist_config.c.version).order_by(_playlist_config.c.id).limit(1)
+_PLAYLIST_CONFIG_ROW_STMT = select(
+    _playlist_config.c.id,
+    _playlist_config.c.version,
+    _playlist_config.c.spotify_playlist_id,
+    _playlist_config.c.spotify_refresh_token,
+    _playlist_config.c.name,
+    _playlist_config.c.description,
+    _playlist_config.c.cover_image_url,
+).order_by(_playlist_config.c.id).limit(1)
+
+
+async def _execute(db: AsyncSession, stmt, params: dict | None = None):
+    conn = await db.connection()
+    return await conn.execute(stmt, params)
+
+
+async def get_feed_version(db: AsyncSession) -> int:
+    version = (await _execute(db, _FEED_VERSION_STMT)).scalar()
+    return version or 0
+
+
+async def get_playlist_config_version(db: AsyncSession) -> int | None:
+    return (await _execute(db, _PLAYLIST_CONFIG_VERSION_STMT)).scalar()
+
+
+async def get_playlist_config_row(db: AsyncSession) -> Row | None:
+    """The playlist_config columns ConfigCache snapshots (tokens aside from the refresh token)."""
+    return (await _execute(db, _PLAYLIST_CONFIG_ROW_STMT)).first()
+
+
+class _SongRowStatements(NamedTuple):
+    all: Select
+    first_page: Select
+    page_before: Select
+    since: Select
+
+
+@functools.lru_cache(maxsize=64)
+def _song_row_statements(columns: tuple[str, ...]) -> _SongRowStatements:
+    """The /songs statements for one column projection, built once per projection."""
+    cols = [_songs.c[name] for name in columns]
+    created_at_type = _songs.c.created_at.type
+    key = tuple_(_songs.c.created_at, _songs.c.id)
+    newest_first = (_songs.c.created_at.desc(), _songs.c.id.desc())
+    limit = bindparam("limit", type_=Integer)
+    before = tuple_(bindparam("before_created_at", type_=created_at_type), bindparam("before_id", type_=Integer))
+    after = tuple_(bindparam("after_created_at", type_=created_at_type), bindparam("after_id", type_=Integer))
+    return _SongRowStatements(
+        all=select(*cols).order_by(_songs.c.created_at.desc()),
+        first_page=select(*cols).order_by(*newest_first).limit(limit),
+        page_before=select(*cols).where(key < before).order_by(*newest_first).limit(limit),
+        since=select(*cols).where(key > after).order_by(_songs.c.created_at.asc(), _songs.c.id.asc()).limit(limit),
+    )
+
+
+# The list_song_rows* variants take column names and return Rows of just
+# those columns, for the JSON encoder; same order and cursors as above.
+
+async def list_song_rows(db: AsyncSession, columns: tuple[str, ...]) -> list[Row]:
+    return list(await _execute(db, _song_row_statements(columns).all))
+
+
+async def list_song_rows_page(
+    db: AsyncSession, columns: tuple[str, ...], limit: int, before: Cursor | None = None
+) -> list[Row]:
+    stmts = _song_row_statements(columns)
+    if before is None:
+        return list(await _execute(db, stmts.first_page, {"limit": limit}))
+    params = {"limit": limit, "before_created_at": before[0], "before_id": before[1]}
+    return list(await _execute(db, stmts.page_before, params))
+
+
+async def list_song_rows_since(db: AsyncSession, columns: tuple[str, ...], after: Cursor, limit: int) -> list[Row]:
+    params = {"limit": limit, "after_created_at": after[0], "after_id": after[1]}
+    return list(await _execute(db, _song_row_statements(columns).since, params))
+
+
+async def bump_feed_version(db: AsyncSession) -> None:
+    # One upsert, so concurrent first writes on a fresh database can't both
+    # try to create the row.
+    stmt = _dialect_insert(db, models.FeedState).values(id=models.FEED_STATE_ID, version=1)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["id"], set_={"version": models.FeedState.version + 1}
+    ))
+
+
+def _dialect_insert(db: AsyncSession, model):
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT upsert is not supported on {dialect}")
+    return insert(model)
+
+
+async def _add_to_stat(db: AsyncSession, model, key: str, songs: list[models.SongEntry]) -> None:
+    counts: Counter = Counter()
+    latest: dict = {}
+    for song in songs:
+        value = getattr(song, key)
+        counts[value] += 1
+        latest[value] = max(latest.get(value, song.created_at), song.created_at)
+    # Sorted keys: concurrent batches lock stat rows in the same order, so
+    # they can't deadlock on each other.
+    stmt = _dialect_insert(db, model).values([
+        {key: value, "song_count": counts[value], "last_added_at": latest[value]} for value in sorted(counts)
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={
+            "song_count": model.song_count + stmt.excluded.song_count,
+            "last_added_at": stmt.excluded.last_added_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def _record_aggregates(db: AsyncSession, songs: list[models.SongEntry]) -> None:
+    await _add_to_stat(db, models.ArtistStat, "artist", songs)
+    await _add_to_stat(db, models.UserStat, "user", songs)
+
+    hours = Counter(models.hour_bucket(song.created_at) for song in songs)
+    stmt = _dialect_insert(db, models.HourlyActivity).values([
+        {"hour": hour, "song_count": n} for hour, n in sorted(hours.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["hour"],
+        set_={"song_count": models.HourlyActivity.song_count + stmt.excluded.song_count},
     )
+    await db.execute(stmt)
 
 
-def create_song(db: Session, song: models.SongEntry) -> models.SongEntry:
+async def _record_inserted(db: AsyncSession, songs: list[models.SongEntry], enqueue_playlist_add: bool) -> None:
+    # Runs in the insert transaction: either all of this lands or none of it.
+    if not songs:
+        return
+    await bump_feed_version(db)
+    await _record_aggregates(db, songs)
+    if enqueue_playlist_add:
+        db.add_all(
+            models.PlaylistOutbox(song_entry_id=song.id, spotify_track_uri=song.spotify_track_uri)
+            for song in songs
+            if song.spotify_track_uri
+        )
+
+
+async def create_song(db: AsyncSession, song: models.SongEntry, enqueue_playlist_add: bool = False) -> models.SongEntry:
     db.add(song)
-    db.commit()
-    db.refresh(song)
+    await db.flush()
+    await _record_inserted(db, [song], enqueue_playlist_add)
+    await db.commit()
     return song
+
+
+def _insert_ignoring_conflicts(db: AsyncSession):
+    return _dialect_insert(db, models.SongEntry).on_conflict_do_nothing(index_elements=["user", "spotify_track_id"])
+
+
+async def find_songs_by_user_and_track(db: AsyncSession, keys: list[tuple[str, str]]) -> list[models.SongEntry]:
+    if not keys:
+        return []
+    stmt = select(models.SongEntry).where(
+        tuple_(models.SongEntry.user, models.SongEntry.spotify_track_id).in_(keys)
+    )
+    return list(await db.scalars(stmt))
+
+
+async def create_songs(
+    db: AsyncSession, songs: list[dict], enqueue_playlist_add: bool = False
+) -> tuple[list[models.SongEntry], list[models.SongEntry]]:
+    """
+    Insert many entries with one INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Returns (created, existing). Conflicts on (user, spotify_track_id) are
+    resolved by the database, so concurrent submissions can't race.
+    """
+    # Collapse duplicates within the request; the last one wins.
+    by_key = {(song["user"], song["spotify_track_id"]): song for song in songs}
+    if not by_key:
+        return [], []
+
+    now = models.utcnow()
+    rows = [{**song, "created_at": now} for song in by_key.values()]
+    created = list(await db.scalars(_insert_ignoring_conflicts(db).returning(models.SongEntry), rows))
+    await _record_inserted(db, created, enqueue_playlist_add)
+    await db.commit()
+
+    created_keys = {(song.user, song.spotify_track_id) for song in created}
+    missing = [key for key in by_key if key not in created_keys]
+    existing = await find_songs_by_user_and_track(db, missing)
+    return created, existing
+
+
+# ---------- Song search ----------
+
+async def search_songs_fulltext(db: AsyncSession, terms: list[str], limit: int) -> list[models.SongEntry]:
+    """Postgres: prefix-match every term against the GIN-indexed tsvector, best rank first."""
+    tsquery = func.to_tsquery(cast("simple", REGCONFIG), " & ".join(f"{term}:*" for term in terms))
+    stmt = (
+        select(models.SongEntry)
+        .where(models.SONG_SEARCH_VECTOR.op("@@")(tsquery))
+        .order_by(
+            func.ts_rank(models.SONG_SEARCH_VECTOR, tsquery).desc(),
+            models.SongEntry.created_at.desc(),
+            models.SongEntry.id.desc(),
+        )
+        .limit(limit)
+    )
+    return list(await db.scalars(stmt))
+
+
+async def iter_song_search_docs(db: AsyncSession, after_id: int, batch_size: int = 1000) -> AsyncIterator[tuple]:
+    """(id, song, artist, user, comment) for entries with id > after_id, in id order."""
+    table = models.SongEntry.__table__
+    stmt = (
+        select(table.c.id, table.c.song, table.c.artist, table.c.user, table.c.comment)
+        .where(table.c.id > after_id)
+        .order_by(table.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for row in result:
+        yield tuple(row)
+
+
+async def get_songs_by_ids(db: AsyncSession, ids: list[int]) -> list[models.SongEntry]:
+    """Entries in the order of `ids`, skipping any that no longer exist."""
+    if not ids:
+        return []
+    by_id = {song.id: song for song in await db.scalars(select(models.SongEntry).where(models.SongEntry.id.in_(ids)))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+# ---------- Spotify track metadata ----------
+
+async def get_tracks(db: AsyncSession, track_ids: list[str]) -> list[models.Track]:
+    if not track_ids:
+        return []
+    stmt = select(models.Track).where(models.Track.spotify_track_id.in_(track_ids))
+    return list(await db.scalars(stmt))
+
+
+async def upsert_tracks(db: AsyncSession, rows: list[dict]) -> None:
+    if not rows:
+        return
+    # Sorted for a consistent lock order across concurrent upserts.
+    rows = sorted(rows, key=lambda row: row["spotify_track_id"])
+    stmt = _dialect_insert(db, models.Track).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["spotify_track_id"],
+        set_={col: stmt.excluded[col] for col in rows[0] if col != "spotify_track_id"},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+# ---------- Aggregates ----------
+
+async def top_artists(db: AsyncSession, limit: int) -> list[models.ArtistStat]:
+    stmt = select(models.ArtistStat).order_by(models.ArtistStat.song_count.desc(), models.ArtistStat.artist)
+    return list(await db.scalars(stmt.limit(limit)))
+
+
+async def top_users(db: AsyncSession, limit: int) -> list[models.UserStat]:
+    stmt = select(models.UserStat).order_by(models.UserStat.song_count.desc(), models.UserStat.user)
+    return list(await db.scalars(stmt.limit(limit)))
+
+
+async def hourly_activity(db: AsyncSession, since: datetime) -> list[models.HourlyActivity]:
+    stmt = select(models.HourlyActivity).where(models.HourlyActivity.hour >= since)
+    return list(await db.scalars(stmt.order_by(models.HourlyActivity.hour)))
+
+
+# ---------- Playlist reconciliation ----------
+
+async def get_playlist_sync_state(db: AsyncSession, playlist_id: str) -> models.PlaylistSyncState | None:
+    return await db.get(models.PlaylistSyncState, playlist_id)
+
+
+async def max_song_id(db: AsyncSession) -> int:
+    return await db.scalar(select(func.max(models.SongEntry.id))) or 0
+
+
+async def song_track_uris(db: AsyncSession, after_id: int, up_to_id: int) -> list[str]:
+    """
+    Distinct track URIs first submitted in (after_id, up_to_id], in
+    submission order. URIs already submitted at or before after_id are left
+    out.
+    """
+    entry = models.SongEntry
+    earlier = aliased(models.SongEntry)
+    first_id = func.min(entry.id)
+    stmt = (
+        select(entry.spotify_track_uri)
+        .where(entry.spotify_track_uri.is_not(None), entry.id > after_id, entry.id <= up_to_id)
+        .group_by(entry.spotify_track_uri)
+        .order_by(first_id)
+    )
+    if after_id:
+        stmt = stmt.where(
+            ~select(earlier.id)
+            .where(earlier.spotify_track_id == entry.spotify_track_id, earlier.id <= after_id)
+            .exists()
+        )
+    return list(await db.scalars(stmt))
+
+
+# ---------- Playlist outbox ----------
+
+async def claim_pending_outbox(db: AsyncSession, now: datetime, limit: int) -> list[models.PlaylistOutbox]:
+    # SKIP LOCKED lets several workers drain concurrently without sending the
+    # same rows twice; the lock is held until the caller commits.
+    stmt = (
+        select(models.PlaylistOutbox)
+        .where(
+            models.PlaylistOutbox.status == models.OUTBOX_PENDING,
+            models.PlaylistOutbox.next_attempt_at <= now,
+        )
+        .order_by(models.PlaylistOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(await db.scalars(stmt))
+
+
+async def outbox_counts(db: AsyncSession) -> dict[str, int]:
+    stmt = select(models.PlaylistOutbox.status, func.count()).group_by(models.PlaylistOutbox.status)
+    return {status: count for status, count in await db.execute(stmt)}
+
+
+async def pending_outbox_uris(db: AsyncSession) -> set[str]:
+    stmt = select(models.PlaylistOutbox.spotify_track_uri).where(models.PlaylistOutbox.status == models.OUTBOX_PENDING)
+    return set(await db.scalars(stmt))
+
+
+async def mark_dead_outbox_sent(db: AsyncSession, uris: list[str], now: datetime) -> int:
+    """Close out dead rows for URIs that reached the playlist some other way (reconciliation)."""
+    if not uris:
+        return 0
+    stmt = (
+        update(models.PlaylistOutbox)
+        .where(models.PlaylistOutbox.status == models.OUTBOX_DEAD, models.PlaylistOutbox.spotify_track_uri.in_(uris))
+        .values(status=models.OUTBOX_SENT, sent_at=now)
+    )
+    return (await db.execute(stmt)).rowcount
+
+
+async def requeue_dead_outbox(db: AsyncSession) -> int:
+    stmt = (
+        update(models.PlaylistOutbox)
+        .where(models.PlaylistOutbox.status == models.OUTBOX_DEAD)
+        .values(status=models.OUTBOX_PENDING, attempts=0, next_attempt_at=models.utcnow(), last_error=None)
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount
@@ -1,27 +1,66 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
 
-from .settings import DATABASE_URL
+from .metrics import instrument_engine, register_pool_gauges
+from .settings import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
 
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL must be set (via silo_env or OS env)")
 
-print("DATABASE_URL:", DATABASE_URL)
+def async_database_url(database_url: str) -> URL:
+    """Map a plain DATABASE_URL onto the asyncio driver for its backend."""
+    url = make_url(database_url)
+    backend = url.drivername.split("+", 1)[0]
+    if backend in ("postgres", "postgresql"):
+        return url.set(drivername="postgresql+psycopg")
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _engine_kwargs(url: URL, pool_size: int, max_overflow: int) -> dict:
+    kwargs: dict = {"pool_pre_ping": True}
+    if url.get_backend_name() != "sqlite":
+        kwargs.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return kwargs
 
 
-class Base(DeclarativeBase):
-    pass
+def make_engine(database_url: str, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> AsyncEngine:
+    url = async_database_url(database_url)
+    engine = create_async_engine(url, **_engine_kwargs(url, pool_size, max_overflow))
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+def make_session_factory(bind: AsyncEngine | None = None) -> async_sessionmaker:
+    # expire_on_commit=False: attributes stay loaded after commit, since async
+    # sessions can't lazy-load them back on access.
+    return async_sessionmaker(bind=bind, autoflush=False, expire_on_commit=False)
+
 
+# Nothing touches the database (or even loads its driver) at import. The
+# engine is built on first get_engine() call, which also binds SessionLocal;
+# the lifespan makes that call before serving.
+SessionLocal = make_session_factory()
+_engine: AsyncEngine | None = None
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL must be set (via silo_env or OS env)")
+        _engine = make_engine(DATABASE_URL)
+        register_pool_gauges(_engine.sync_engine)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+class Base(DeclarativeBase):
+    pass
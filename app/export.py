@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+
+EXPORT_COLUMNS = [
+    "id",
+    "spotify_track_id",
+    "spotify_track_uri",
+    "song",
+    "artist",
+    "album_art_url",
+    "user",
+    "user_avatar_url",
+    "comment",
+    "created_at",
+]
+
+# Rows fetched per server-side cursor round trip, and rows per emitted chunk.
+EXPORT_BATCH_SIZE = 1000
+
+
+async def _iter_rows(db: AsyncSession, start: datetime | None, end: datetime | None) -> AsyncIterator[tuple]:
+    table = models.SongEntry.__table__
+    stmt = select(*(table.c[name] for name in EXPORT_COLUMNS))
+    if start is not None:
+        stmt = stmt.where(table.c.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(table.c.created_at < end)
+    stmt = stmt.order_by(table.c.created_at, table.c.id)
+
+    # Core rows (no ORM identity map) over a server-side cursor keep memory
+    # flat regardless of table size.
+    result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.partitions():
+        for row in partition:
+            yield row
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def stream_ndjson(
+    session_factory: async_sessionmaker, start: datetime | None, end: datetime | None
+) -> AsyncIterator[str]:
+    # Owns its session: the response body outlives the request dependency.
+    async with session_factory() as db:
+        lines: list[str] = []
+        async for row in _iter_rows(db, start, end):
+            record = {name: _isoformat(value) for name, value in zip(EXPORT_COLUMNS, row)}
+            lines.append(json.dumps(record, ensure_ascii=False))
+            if len(lines) >= EXPORT_BATCH_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines.clear()
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+
+async def stream_csv(
+    session_factory: async_sessionmaker, start: datetime | None, end: datetime | None
+) -> AsyncIterator[str]:
+    async with session_factory() as db:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        count = 0
+        async for row in _iter_rows(db, start, end):
+            writer.writerow([_isoformat(value) for value in row])
+            count += 1
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:  # optional; pydantic_core's Rust encoder is nearly as fast
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode plain data (dicts, lists, str, numbers, datetimes) to JSON bytes."""
+    if orjson is not None:
+        # "Z" for UTC, as pydantic writes it.
+        return orjson.dumps(obj, option=orjson.OPT_UTC_Z)
+    return to_json(obj)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
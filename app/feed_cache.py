@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from .settings import FEED_VERSION_CHECK_SECONDS, FEED_CACHE_MAX_ENTRIES
+
+
+class FeedCache:
+    """
+    Pre-serialized /songs response bodies for the current feed version.
+
+    The version lives in feed_state and is re-read at most every
+    `check_interval` seconds; local inserts call invalidate() so this worker
+    sees its own writes immediately. Any version change drops all bodies.
+
+    The version never goes backwards: a lagging replica reporting an older one
+    gets it back (so its reads miss the cache) without disturbing the cache.
+    """
+
+    def __init__(self, check_interval: float, max_entries: int):
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._version: int | None = None
+        self._checked_at = 0.0
+        self._bodies: OrderedDict[Hashable, bytes] = OrderedDict()
+
+    def invalidate(self) -> None:
+        self._version = None
+        self._bodies.clear()
+
+    async def current_version(self, db: AsyncSession, max_age: float | None = None) -> int:
+        """`max_age` overrides check_interval (0: always read the version)."""
+        now = time.monotonic()
+        max_age = self.check_interval if max_age is None else max_age
+        if self._version is not None and now - self._checked_at < max_age:
+            return self._version
+
+        version = await crud.get_feed_version(db)
+        if self._version is not None and version < self._version:
+            return version
+        if version != self._version:
+            self._bodies.clear()
+            self._version = version
+        self._checked_at = now
+        return version
+
+    def get(self, version: int, key: Hashable) -> bytes | None:
+        if version != self._version:
+            return None
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+        return body
+
+    def put(self, version: int, key: Hashable, body: bytes) -> None:
+        if version != self._version:
+            return
+        self._bodies[key] = body
+        self._bodies.move_to_end(key)
+        while len(self._bodies) > self.max_entries:
+            self._bodies.popitem(last=False)
+
+
+feed_cache = FeedCache(check_interval=FEED_VERSION_CHECK_SECONDS, max_entries=FEED_CACHE_MAX_ENTRIES)
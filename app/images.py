@@ -0,0 +1,358 @@
+"""
+/images: a caching proxy for album art and avatars.
+
+Each origin URL is fetched once, through one pooled client, and stored by
+content hash; thumbnails are resized in a thread pool and stored next to the
+original, so identical images behind different URLs share files. The cache
+directory is bounded by total size, evicting least recently used files.
+Pillow is in requirements.txt; without it (a bare dev install) originals are
+served as-is (still cached).
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+
+from .settings import (
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_FETCH_MAX_BYTES,
+    IMAGE_PROXY_ALLOWED_HOSTS,
+    IMAGE_PROXY_BASE_URL,
+    IMAGE_THUMB_DEFAULT_WIDTH,
+    IMAGE_THUMB_WIDTHS,
+    IMAGE_WORKERS,
+)
+
+try:
+    from PIL import Image
+except ImportError:  # optional; without it originals are served unresized
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMB_MEDIA_TYPE = "image/jpeg"
+THUMB_QUALITY = 80
+# In-memory url -> content hash entries; past this the map starts over (the
+# refs/ files still answer).
+MAX_REFS = 100_000
+
+
+class ImageProxyError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def proxy_allowed(url: str) -> bool:
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        return False
+    host = parts.hostname.lower()
+    return any(
+        host.endswith(allowed) if allowed.startswith(".") else host == allowed
+        for allowed in IMAGE_PROXY_ALLOWED_HOSTS
+    )
+
+
+# Cached: the same album art shows up on many rows of every /songs page.
+@functools.lru_cache(maxsize=8192)
+def thumbnail_url(url: str | None, width: int = IMAGE_THUMB_DEFAULT_WIDTH) -> str | None:
+    """
+    Proxy URL for a thumbnail of `url`, or None if the proxy won't fetch it
+    or IMAGE_PROXY_BASE_URL isn't set.
+    """
+    if not IMAGE_PROXY_BASE_URL or not url or not proxy_allowed(url):
+        return None
+    return f"{IMAGE_PROXY_BASE_URL}/images?{urlencode({'url': url, 'w': width})}"
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _resize(data: bytes, width: int) -> bytes:
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (width, width))  # lets JPEG decode at reduced scale
+        img = img.convert("RGB")
+        if img.width > width:
+            img.thumbnail((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=THUMB_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+class ImageCache:
+    """
+    Content-addressed image store under `root`:
+
+        refs/<hash of url>             "<content hash> <media type>" of the origin
+        objects/<ab>/<hash>            original bytes
+        objects/<ab>/<hash>.w<width>   thumbnails
+
+    Object sizes are tracked in memory (seeded from the directory on first
+    use, oldest file first) so eviction needs no directory walks. Files
+    removed behind our back (another worker's eviction) count as misses.
+    """
+
+    def __init__(self, root: str, max_bytes: int, workers: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._lru: OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        self._loaded: asyncio.Task | None = None
+        # url -> (content hash, media type)
+        self._refs: dict[str, tuple[str, str]] = {}
+        self._inflight: dict[tuple[str, int], asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evictions = 0
+
+    # ---------- plumbing ----------
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="images")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            # Not the Spotify metrics transport: CDN paths would be counted as
+            # API calls, one label per image. image_cache_stats counts fetches.
+            self._client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(http2=True, limits=limits),
+                timeout=10,
+                follow_redirects=False,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _object_path(self, content_hash: str, width: int | None = None) -> str:
+        name = content_hash if width is None else f"{content_hash}.w{width}"
+        return os.path.join(self.root, "objects", content_hash[:2], name)
+
+    def _ref_path(self, url: str) -> str:
+        return os.path.join(self.root, "refs", _digest(url.encode()))
+
+    # ---------- size-bounded LRU ----------
+
+    def _scan(self) -> list[tuple[str, int]]:
+        found = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "objects")):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+        found.sort()
+        return [(path, size) for _, path, size in found]
+
+    async def _load(self) -> None:
+        for path, size in await self._run(self._scan):
+            self._lru[path] = size
+            self._total += size
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._loaded)
+
+    def _touch(self, path: str) -> bool:
+        if path not in self._lru:
+            return False
+        if not os.path.exists(path):
+            self._total -= self._lru.pop(path)
+            return False
+        self._lru.move_to_end(path)
+        return True
+
+    def _evict_paths(self) -> list[str]:
+        victims = []
+        while self._total > self.max_bytes and self._lru:
+            path, size = self._lru.popitem(last=False)
+            self._total -= size
+            victims.append(path)
+        self.evictions += len(victims)
+        return victims
+
+    async def _add(self, path: str, data: bytes) -> None:
+        await self._run(_write_atomic, path, data)
+        self._total += len(data) - self._lru.get(path, 0)
+        self._lru[path] = len(data)
+        victims = self._evict_paths()
+        if victims:
+            await self._run(_remove_all, victims)
+
+    # ---------- fetch and resize ----------
+
+    def _remember_ref(self, url: str, content_hash: str, media_type: str) -> tuple[str, str]:
+        if len(self._refs) >= MAX_REFS:
+            self._refs.clear()
+        ref = self._refs[url] = (content_hash, media_type)
+        return ref
+
+    async def _load_ref(self, url: str) -> tuple[str, str] | None:
+        ref = self._refs.get(url)
+        if ref is None:
+            text = await self._run(_read_text, self._ref_path(url))
+            if text:
+                content_hash, _, media_type = text.partition(" ")
+                ref = self._remember_ref(url, content_hash, media_type)
+        return ref
+
+    async def _fetch(self, url: str) -> tuple[str, str, bytes]:
+        self.fetches += 1
+        try:
+            async with self._get_client().stream("GET", url) as resp:
+                if resp.status_code == 404:
+                    raise ImageProxyError("Image not found at origin.", 404)
+                if resp.status_code != 200:
+                    raise ImageProxyError(f"Origin answered {resp.status_code}.", 502)
+                media_type = resp.headers.get("content-type", "").split(";")[0].strip()
+                if not media_type.startswith("image/"):
+                    raise ImageProxyError("Origin did not return an image.", 502)
+                chunks, size = [], 0
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    if size > IMAGE_FETCH_MAX_BYTES:
+                        raise ImageProxyError("Image too large.", 502)
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            raise ImageProxyError(f"Fetching image failed: {e}", 502) from e
+        data = b"".join(chunks)
+        return _digest(data), media_type, data
+
+    async def _original(self, url: str) -> tuple[str, str, bytes | None]:
+        """(content hash, media type, bytes if we had to fetch them)."""
+        ref = await self._load_ref(url)
+        if ref is not None and self._touch(self._object_path(ref[0])):
+            return ref[0], ref[1], None
+        content_hash, media_type, data = await self._fetch(url)
+        await self._add(self._object_path(content_hash), data)
+        await self._run(_write_atomic, self._ref_path(url), f"{content_hash} {media_type}".encode())
+        self._remember_ref(url, content_hash, media_type)
+        return content_hash, media_type, data
+
+    async def _produce(self, url: str, width: int) -> tuple[str, str]:
+        content_hash, media_type, data = await self._original(url)
+        if Image is None:
+            return self._object_path(content_hash), media_type
+        thumb_path = self._object_path(content_hash, width)
+        if self._touch(thumb_path):
+            return thumb_path, THUMB_MEDIA_TYPE
+        if data is None:
+            data = await self._run(_read_bytes, self._object_path(content_hash))
+        try:
+            thumb = await self._run(_resize, data, width)
+        except (OSError, ValueError) as e:  # Pillow: unreadable image
+            raise ImageProxyError(f"Could not decode image: {e}", 502) from e
+        await self._add(thumb_path, thumb)
+        return thumb_path, THUMB_MEDIA_TYPE
+
+    async def thumbnail(self, url: str, width: int) -> tuple[str, str]:
+        """Path and media type of the cached thumbnail, fetching/resizing on a miss."""
+        if not proxy_allowed(url):
+            raise ImageProxyError("Image host not allowed.", 400)
+        if width not in IMAGE_THUMB_WIDTHS:
+            raise ImageProxyError(f"w must be one of {', '.join(map(str, IMAGE_THUMB_WIDTHS))}.", 400)
+        await self._ensure_loaded()
+
+        ref = self._refs.get(url)
+        if ref is not None:
+            path = self._object_path(ref[0], width if Image is not None else None)
+            if self._touch(path):
+                self.hits += 1
+                return path, THUMB_MEDIA_TYPE if Image is not None else ref[1]
+
+        # Concurrent misses for the same image share one fetch and resize.
+        key = (url, width)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        self.misses += 1
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await self._produce(url, width)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved so an un-awaited future doesn't warn
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "files": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "evictions": self.evictions,
+            "resize": 1 if Image is not None else 0,
+        }
+
+
+def _read_text(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _remove_all(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES, workers=IMAGE_WORKERS)
@@ -1,38 +1,87 @@
 from __future__ import annotations
 
-from fastapi import Depends, FastAPI, HTTPException, Response
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Hashable, Literal
 
-from .database import Base, engine, get_db
-from . import crud, schemas
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, fastjson, models, schemas
+from .broadcast import song_event, sse_frame
+from .metrics import GaugeCallback, MetricsMiddleware, registry, render_metrics
+from .http_cache import etag_matches, make_etag, not_modified
+from .export import stream_csv, stream_ndjson
+from .compression import CompressionMiddleware
+from .fastjson import FastJSONResponse
+from .images import ImageProxyError, image_cache, thumbnail_url
+from .pagination import decode_cursor, encode_cursor
 from .auth import create_admin_token, get_current_admin
 from .settings import (
     FRONTEND_ADMIN_URL,
     FRONTEND_ORIGIN,
+    FEED_STREAM_HEARTBEAT_SECONDS,
+    IMAGE_THUMB_DEFAULT_WIDTH,
+    METRICS_TOKEN,
     ADMIN_USERNAME,
     ADMIN_PASSWORD,
-    derived_playlist_title,
-    derived_playlist_description,
+    PLAYLIST_CONFIG_MAX_AGE,
+    check_required_settings,
 )
 from .spotify_client import (
     build_spotify_authorize_url,
-    exchange_code_for_tokens,
-    get_user_profile,
-    create_playlist_for_user,
-    get_valid_access_token,
-    search_tracks,
+    exchange_code_for_tokens_async,
+    get_user_profile_async,
+    create_playlist_for_user_async,
+    search_tracks_async,
+    close_http_client,
+    governor,
     SpotifyAuthError,
     SpotifyApiError,
+    SpotifyUnavailableError,
 )
-from .services import add_song_to_app_playlist
-print("FRONTEND_ORIGIN =", FRONTEND_ORIGIN)
+from .reconcile import PlaylistNotLinkedError, reconcile_playlist
+from .search_cache import normalize_query, search_cache
+from .services import add_song_to_app_playlist, add_songs_to_app_playlist, search_songs
+from .replicas import REPLICA_SESSION, STICKY_SESSION, ReadYourWritesMiddleware, replica_pool
+from .silos import Silo, SiloMiddleware, default_silo, get_db, get_read_db, get_silo, silo_registry
+from .startup import startup_profile
+from .tracks import SEARCH_EXTRA_FIELDS, UnknownTrackError, slim_search_result, track_catalog
+from .stats import rebuild_stats
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    startup_profile.mark("lifespan_start")
+    check_required_settings()
+    logger.info("Serving frontend origin %s", FRONTEND_ORIGIN)
+    # The database engine and Spotify HTTP client are created on first use.
+    if silo_registry is None:
+        # Checks the schema (see app.schema) and starts the background tasks.
+        await default_silo.start()
+    startup_profile.mark("ready")
+    try:
+        yield
+    finally:
+        if silo_registry is None:
+            await default_silo.stop()
+        else:
+            await silo_registry.close()
+        await close_http_client()
+        await image_cache.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# Create tables (note: does not migrate existing tables)
-Base.metadata.create_all(bind=engine)
+# Added first so it is innermost, right around the routes.
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -43,21 +92,84 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if replica_pool is not None or (silo_registry is not None and silo_registry.has_replicas):
+    app.add_middleware(ReadYourWritesMiddleware)
+if silo_registry is not None:
+    app.add_middleware(SiloMiddleware, registry=silo_registry)
+# Added last so it is outermost and times the whole stack.
+app.add_middleware(MetricsMiddleware)
+
+registry.register(GaugeCallback(
+    "search_cache_stats",
+    "/spotify/search cache counters and size.",
+    ("stat",),
+    lambda: (((k,), v) for k, v in search_cache.stats().items()),
+))
+registry.register(GaugeCallback(
+    "spotify_governor_state",
+    "Spotify rate-limit governor: breaker, Retry-After pause, token bucket.",
+    ("stat",),
+    lambda: (((k,), v) for k, v in governor.stats().items()),
+))
+registry.register(GaugeCallback(
+    "track_catalog_stats",
+    "Spotify track metadata cache: memory/DB hits, upstream fetches, unknown ids.",
+    ("stat",),
+    lambda: (((k,), v) for k, v in track_catalog.stats().items()),
+))
+registry.register(GaugeCallback(
+    "image_cache_stats",
+    "/images thumbnail cache: size on disk, hits, origin fetches, evictions.",
+    ("stat",),
+    lambda: (((k,), v) for k, v in image_cache.stats().items()),
+))
+if replica_pool is not None:
+    registry.register(GaugeCallback(
+        "db_replica_stats",
+        "Read replicas: healthy count, reads routed to replicas, fallbacks to the primary.",
+        ("stat",),
+        lambda: (((k,), v) for k, v in replica_pool.stats().items()),
+    ))
+    registry.register(GaugeCallback(
+        "db_replica_lag_seconds",
+        "Replication lag per replica at the last health check.",
+        ("replica",),
+        replica_pool.lag_samples,
+    ))
+if silo_registry is not None:
+    registry.register(GaugeCallback(
+        "silo_registry_stats",
+        "Multi-silo registry: known, open and evicted silos.",
+        ("stat",),
+        lambda: (((k,), v) for k, v in silo_registry.stats().items()),
+    ))
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str | None = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token.")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # ---------- Admin auth ----------
 
 @app.post("/admin/login")
-def admin_login(response: Response, creds: schemas.AdminLoginRequest):
+async def admin_login(
+    request: Request,
+    response: Response,
+    creds: schemas.AdminLoginRequest,
+    silo: Silo = Depends(get_silo),
+):
     if creds.username != ADMIN_USERNAME or creds.password != ADMIN_PASSWORD:
         raise HTTPException(status_code=401, detail="Invalid admin credentials.")
 
-    token = create_admin_token(sub=creds.username)
+    token = create_admin_token(sub=creds.username, silo_id=silo.id)
 
     is_https_frontend = FRONTEND_ORIGIN.startswith("https://")
 
@@ -67,22 +179,28 @@ def admin_login(response: Response, creds: schemas.AdminLoginRequest):
         httponly=True,
         samesite="none" if is_https_frontend else "lax",
         secure=True if is_https_frontend else False,
-        path="/",
+        path=_admin_cookie_path(request),
     )
 
     return {"ok": True}
 
 
+def _admin_cookie_path(request: Request) -> str:
+    # Under path routing each silo's session lives below its own /s/<id>
+    # prefix, so signing in to one silo doesn't replace another's cookie.
+    return request.scope.get("root_path") or "/"
+
+
 @app.post("/admin/logout")
-def admin_logout(response: Response):
-    response.delete_cookie("admin_session", path="/")
+async def admin_logout(request: Request, response: Response):
+    response.delete_cookie("admin_session", path=_admin_cookie_path(request))
     return {"ok": True}
 
 
 # ---------- Admin session check ----------
 
 @app.get("/admin/me")
-def admin_me(_: str = Depends(get_current_admin)):
+async def admin_me(_: str = Depends(get_current_admin)):
     """
     Simple endpoint to verify the admin_session cookie is valid.
     FE uses this to gate admin flows and show logged-in state.
@@ -94,71 +212,110 @@ def admin_me(_: str = Depends(get_current_admin)):
 # This is what the FE uses to decide "isReady" and populate the playlist card.
 
 @app.get("/playlist/config", response_model=schemas.PlaylistConfigStatus)
-def get_playlist_config_status(db: Session = Depends(get_db)):
-    cfg = crud.get_playlist_config(db)
+async def get_playlist_config_status(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    silo: Silo = Depends(get_silo),
+):
+    # Right after the client's own write: check the primary's version now.
+    cfg = await silo.config_cache.get(db, max_age=0 if db.info.get(STICKY_SESSION) else None)
 
-    default_title = derived_playlist_title()
-    default_desc = derived_playlist_description()
+    default_title = silo.playlist_title()
+    default_desc = silo.playlist_description()
 
     if cfg is None:
-        return schemas.PlaylistConfigStatus(
+        status_out = schemas.PlaylistConfigStatus(
             exists=False,
             name=default_title,
             spotify_playlist_id=None,
             description=default_desc,
             cover_image_url=None,
         )
+    else:
+        status_out = schemas.PlaylistConfigStatus(
+            exists=True,
+            name=cfg.name or default_title,
+            spotify_playlist_id=cfg.spotify_playlist_id,
+            description=cfg.description or default_desc,
+            cover_image_url=cfg.cover_image_url,
+        )
 
-    return schemas.PlaylistConfigStatus(
-        exists=True,
-        name=cfg.name or default_title,
-        spotify_playlist_id=cfg.spotify_playlist_id,
-        description=cfg.description or default_desc,
-        cover_image_url=cfg.cover_image_url,
-    )
+    # Hash the payload itself: defaults come from settings, not the row.
+    etag = make_etag(status_out.model_dump_json())
+    cache_control = f"public, max-age={PLAYLIST_CONFIG_MAX_AGE}"
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return status_out
 
 
 # ---------- Admin "ensure config row exists" ----------
 # Kept for your admin flow; right now it just creates the row.
 
 @app.post("/playlist/config")
-def create_playlist_config(
+async def create_playlist_config(
     payload: schemas.PlaylistConfigCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
     _: str = Depends(get_current_admin),
 ):
-    cfg = crud.ensure_playlist_config_row(db)
+    cfg = await crud.ensure_playlist_config_row(db)
     if payload.name is not None:
         cfg.name = payload.name
     if payload.description is not None:
         cfg.description = payload.description
     if payload.cover_image_url is not None:
         cfg.cover_image_url = payload.cover_image_url
+    crud.bump_playlist_config_version(cfg)
     db.add(cfg)
-    db.commit()
-    db.refresh(cfg)
+    await db.commit()
+    silo.config_cache.invalidate()
     return {"ok": True}
 
 
 # ---------- Spotify OAuth ----------
 
 @app.get("/admin/spotify/authorize")
-def admin_spotify_authorize(
-    db: Session = Depends(get_db),
+async def admin_spotify_authorize(
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
     _: str = Depends(get_current_admin),
 ):
-    cfg = crud.ensure_playlist_config_row(db)
+    cfg = await crud.ensure_playlist_config_row(db)
+    silo.config_cache.invalidate()
     state = str(cfg.id)  # simple state: config id
+    if silo_registry is not None:
+        state = f"{silo.id}:{state}"
     url = build_spotify_authorize_url(state=state)
     return {"authorize_url": url}
 
 
+async def _callback_silo(request: Request, state: str | None = None) -> Silo:
+    # Spotify redirects every silo to the one registered URI, so in multi-silo
+    # mode the silo id travels in `state` ("<silo_id>:<config id>").
+    if silo_registry is None or not state:
+        return get_silo(request)
+    silo_id = state.rpartition(":")[0]
+    if silo_id not in silo_registry:
+        raise HTTPException(status_code=400, detail="Unknown silo in state.")
+    return await silo_registry.get(silo_id)
+
+
+async def _callback_db(silo: Silo = Depends(_callback_silo)):
+    async with silo.session_factory() as db:
+        yield db
+
+
 @app.get("/admin/spotify/callback")
-def admin_spotify_callback(
+async def admin_spotify_callback(
     code: str | None = None,
     state: str | None = None,
     error: str | None = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(_callback_db),
+    silo: Silo = Depends(_callback_silo),
 ):
     if error:
         return RedirectResponse(f"{FRONTEND_ADMIN_URL}?spotify_error={error}")
@@ -166,12 +323,12 @@ def admin_spotify_callback(
     if not code or not state:
         return RedirectResponse(f"{FRONTEND_ADMIN_URL}?spotify_error=missing_code_or_state")
 
-    cfg = crud.get_playlist_config(db)
+    cfg = await crud.get_playlist_config(db)
     if cfg is None:
-        cfg = crud.ensure_playlist_config_row(db)
+        cfg = await crud.ensure_playlist_config_row(db)
 
     try:
-        token_data = exchange_code_for_tokens(code)
+        token_data = await exchange_code_for_tokens_async(code)
 
         access_token = token_data.get("access_token")
         refresh_token = token_data.get("refresh_token")
@@ -186,31 +343,35 @@ def admin_spotify_callback(
         cfg.spotify_access_token = access_token
         cfg.spotify_refresh_token = refresh_token
         cfg.spotify_access_token_expires_at = now + timedelta(seconds=expires_in)
+        crud.bump_playlist_config_version(cfg)
         db.add(cfg)
-        db.commit()
-        db.refresh(cfg)
+        await db.commit()
+        await db.refresh(cfg)
+        silo.config_cache.invalidate()
+        silo.token_manager.prime(access_token, now + timedelta(seconds=expires_in))
 
         # create playlist if not already created
         if not cfg.spotify_playlist_id:
-            profile = get_user_profile(access_token)
+            profile = await get_user_profile_async(access_token)
             user_id = profile.get("id")
             if not user_id:
                 return RedirectResponse(f"{FRONTEND_ADMIN_URL}?spotify_error=no_user_id")
 
-            playlist = create_playlist_for_user(
+            playlist = await create_playlist_for_user_async(
                 access_token=access_token,
                 user_id=user_id,
-                name=derived_playlist_title(),
-                description=derived_playlist_description(),
+                name=silo.playlist_title(),
+                description=silo.playlist_description(),
             )
             playlist_id = playlist.get("id")
             if not playlist_id:
                 return RedirectResponse(f"{FRONTEND_ADMIN_URL}?spotify_error=no_playlist_id")
 
             cfg.spotify_playlist_id = playlist_id
+            crud.bump_playlist_config_version(cfg)
             db.add(cfg)
-            db.commit()
-            db.refresh(cfg)
+            await db.commit()
+            silo.config_cache.invalidate()
 
         return RedirectResponse(f"{FRONTEND_ADMIN_URL}?spotify_connected=1")
     except (SpotifyAuthError, SpotifyApiError) as e:
@@ -219,29 +380,452 @@ def admin_spotify_callback(
 
 # ---------- Public Spotify search (FE uses this) ----------
 
-@app.get("/spotify/search")
-def spotify_search(q: str, limit: int = 10, db: Session = Depends(get_db)):
-    cfg = crud.get_playlist_config(db)
-    if cfg is None or not cfg.spotify_refresh_token:
+def _search_fields(fields: str | None) -> frozenset[str]:
+    requested = frozenset(f.strip() for f in (fields or "").split(",") if f.strip())
+    unknown = requested - SEARCH_EXTRA_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(SEARCH_EXTRA_FIELDS))}.",
+        )
+    return requested
+
+
+@app.get("/spotify/search", response_model=schemas.SpotifySearchResult)
+async def spotify_search(
+    q: str,
+    limit: int = 10,
+    fields: str | None = Query(None, description="Comma-separated extras, e.g. album,duration_ms"),
+    format: Literal["slim", "raw"] = Query("slim", description="raw: Spotify's /search response verbatim"),
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
+):
+    extra_fields = _search_fields(fields)
+    cfg = await silo.config_cache.get(db)
+    if cfg is None or not cfg.spotify_connected:
         raise HTTPException(status_code=400, detail="Playlist or Spotify connection is not fully configured.")
 
+    query = normalize_query(q)
+
+    async def load() -> dict:
+        access_token = await silo.token_manager.get_access_token()
+        result = await search_tracks_async(access_token, query, limit=limit)
+        await track_catalog.store(db, result.get("tracks", {}).get("items", []))
+        return result
+
+    def render(result: dict, headers: dict | None = None) -> Response:
+        content = result if format == "raw" else slim_search_result(result, extra_fields)
+        return FastJSONResponse(content, headers=headers)
+
+    key = (query, limit)
     try:
-        access_token = get_valid_access_token(db, cfg)
-        return search_tracks(access_token, q, limit=limit)
+        return render(await search_cache.get_or_load(key, load))
+    except SpotifyUnavailableError as e:
+        # Degraded: an expired answer beats none for typeahead.
+        stale = search_cache.get_stale(key)
+        if stale is not None:
+            return render(stale, headers={"X-Cache": "stale"})
+        raise HTTPException(
+            status_code=503,
+            detail=f"Spotify search unavailable: {e}",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
     except SpotifyAuthError as e:
         raise HTTPException(status_code=502, detail=f"Spotify auth error: {e}")
     except SpotifyApiError as e:
         raise HTTPException(status_code=502, detail=f"Spotify search error: {e}")
 
 
+@app.get("/admin/search-cache")
+async def search_cache_stats(_: str = Depends(get_current_admin)):
+    return search_cache.stats()
+
+
+# ---------- Admin export ----------
+
+@app.get("/admin/songs/export")
+async def export_songs(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    silo: Silo = Depends(get_silo),
+    _: str = Depends(get_current_admin),
+):
+    if format == "csv":
+        body, media_type = stream_csv(silo.session_factory, start, end), "text/csv"
+    else:
+        body, media_type = stream_ndjson(silo.session_factory, start, end), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="songs.{format}"'},
+    )
+
+
+# ---------- Admin playlist outbox ----------
+
+@app.get("/admin/outbox")
+async def outbox_status(db: AsyncSession = Depends(get_db), _: str = Depends(get_current_admin)):
+    return await crud.outbox_counts(db)
+
+
+@app.post("/admin/outbox/requeue-dead")
+async def outbox_requeue_dead(
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
+    _: str = Depends(get_current_admin),
+):
+    requeued = await crud.requeue_dead_outbox(db)
+    if requeued:
+        silo.outbox.notify()
+    return {"requeued": requeued}
+
+
+# ---------- Admin playlist reconciliation ----------
+
+@app.post("/admin/playlist/reconcile")
+async def playlist_reconcile(
+    full: bool = False,
+    silo: Silo = Depends(get_silo),
+    _: str = Depends(get_current_admin),
+):
+    try:
+        return await reconcile_playlist(silo, full=full)
+    except PlaylistNotLinkedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SpotifyUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Spotify unavailable: {e}",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+    except (SpotifyAuthError, SpotifyApiError) as e:
+        raise HTTPException(status_code=502, detail=f"Spotify error: {e}")
+
+
+# ---------- Admin stats ----------
+
+@app.post("/admin/stats/rebuild")
+async def stats_rebuild(
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
+    _: str = Depends(get_current_admin),
+):
+    counted = await rebuild_stats(db)
+    silo.feed_cache.invalidate()
+    return {"songs": counted}
+
+
+# ---------- Image proxy ----------
+
+# Cached files are content-addressed, so a URL's bytes never change.
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@app.get("/images")
+async def image_proxy(url: str, w: int = IMAGE_THUMB_DEFAULT_WIDTH):
+    """Thumbnail of an album-art or avatar URL, `w` pixels wide (see SongOut.*_thumb_url)."""
+    try:
+        path, media_type = await image_cache.thumbnail(url, w)
+    except ImageProxyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": IMAGE_CACHE_CONTROL})
+
+
 # ---------- Songs ----------
 
-@app.get("/songs", response_model=list[schemas.SongOut])
-def list_songs(db: Session = Depends(get_db)):
-    return crud.list_songs(db)
+async def _feed_cached(
+    request: Request,
+    db: AsyncSession,
+    silo: Silo,
+    name: str,
+    params: tuple,
+    build: Callable[[], Awaitable[bytes]],
+) -> Response:
+    # The feed version changes on every insert, so (version, params) fully
+    # determines the body: answer 304s and repeat polls without querying.
+    # Right after the client's own write, read the primary's version now.
+    version = await silo.feed_cache.current_version(db, max_age=0 if db.info.get(STICKY_SESSION) else None)
+    etag = make_etag(name, version, params)
+    cache_control = "no-cache"
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+
+    key: Hashable = (name, params)
+    body = silo.feed_cache.get(version, key)
+    if body is None:
+        if db.info.get(REPLICA_SESSION):
+            # The cached version may be ahead of this replica: label the body
+            # with the version it is built from (put() drops it if that's old).
+            version = await crud.get_feed_version(db)
+            etag = make_etag(name, version, params)
+            if etag_matches(request, etag):
+                return not_modified(etag, cache_control)
+        body = await build()
+        silo.feed_cache.put(version, key, body)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+def _entry_cursor(entry) -> str:
+    return encode_cursor(entry.created_at, entry.id)
+
+
+SONG_COLUMNS = tuple(schemas.SongOut.model_fields)
+# SongOut's computed fields: (name, source column, function of its value).
+SONG_DERIVED = (
+    ("album_art_thumb_url", "album_art_url", thumbnail_url),
+    ("user_avatar_thumb_url", "user_avatar_url", thumbnail_url),
+)
+SONG_FIELDS = SONG_COLUMNS + tuple(name for name, _, _ in SONG_DERIVED)
+
+
+def _song_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return SONG_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(SONG_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(SONG_FIELDS)}.",
+        )
+    return tuple(f for f in SONG_FIELDS if f in requested)
+
+
+async def _build_songs_page(
+    db: AsyncSession, limit: int, cursor: str | None, since: str | None, all_: bool, fields: tuple[str, ...]
+) -> bytes:
+    """
+    The SongPage body (a bare SongOut list for `all_`), built from Core rows
+    of just the needed columns and encoded directly; no ORM instances or
+    SongOut validation on this path.
+    """
+    plain = tuple(f for f in fields if f in SONG_COLUMNS)
+    derived = [(name, source, fn) for name, source, fn in SONG_DERIVED if name in fields]
+    # Cursors need id and created_at even when they aren't projected.
+    extra = ("id", "created_at") + tuple(source for _, source, _ in derived)
+    selected = plain + tuple(dict.fromkeys(f for f in extra if f not in plain))
+    derived_at = [(name, selected.index(source), fn) for name, source, fn in derived]
+
+    def item(row) -> dict:
+        # zip stops at len(plain), dropping the cursor-only columns.
+        out = dict(zip(plain, row))
+        for name, i, fn in derived_at:
+            out[name] = fn(row[i])
+        return out
+
+    def page(rows, next_cursor: str | None = None, latest_cursor: str | None = None) -> bytes:
+        items = [item(row) for row in rows]
+        return fastjson.dumps({"items": items, "next_cursor": next_cursor, "latest_cursor": latest_cursor})
+
+    # Full, unpaginated list; explicit opt-in only, in the original
+    # bare-array shape for clients that predate pagination.
+    if all_:
+        return fastjson.dumps([item(row) for row in await crud.list_song_rows(db, selected)])
+
+    try:
+        before = decode_cursor(cursor) if cursor else None
+        after = decode_cursor(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    if after is not None:
+        # Poll for entries newer than the client's last sync, oldest first.
+        rows = await crud.list_song_rows_since(db, selected, after, limit)
+        return page(rows, latest_cursor=_entry_cursor(rows[-1]) if rows else since)
+
+    rows = await crud.list_song_rows_page(db, selected, limit, before=before)
+    return page(
+        rows,
+        next_cursor=_entry_cursor(rows[-1]) if len(rows) == limit else None,
+        latest_cursor=_entry_cursor(rows[0]) if rows and before is None else None,
+    )
+
+
+@app.get("/songs", response_model=schemas.SongPage | list[schemas.SongOut])
+async def list_songs(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    since: str | None = None,
+    all_: bool = Query(False, alias="all"),
+    fields: str | None = Query(None, description="Comma-separated SongOut fields to include, e.g. id,song,artist"),
+    db: AsyncSession = Depends(get_read_db),
+    silo: Silo = Depends(get_silo),
+):
+    projection = _song_fields(fields)
+
+    async def build() -> bytes:
+        return await _build_songs_page(db, limit, cursor, since, all_, projection)
+
+    return await _feed_cached(request, db, silo, "songs", (limit, cursor, since, all_, projection), build)
+
+
+@app.get("/songs/search", response_model=list[schemas.SongOut])
+async def search_song_entries(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    silo: Silo = Depends(get_silo),
+):
+    """Songs already submitted whose title, artist, submitter or comment match `q`."""
+    return await search_songs(silo, db, q, limit)
+
+
+# Rows per replay query when a stream client resumes.
+STREAM_REPLAY_PAGE = 200
+
+
+async def _replay_since(silo: Silo, after, limit: int):
+    async with silo.session_factory() as db:
+        return await crud.list_songs_since(db, after, limit)
+
+
+@app.get("/songs/stream")
+async def stream_songs(
+    request: Request,
+    since: str | None = None,
+    last_event_id: str | None = Header(None),
+    silo: Silo = Depends(get_silo),
+):
+    """
+    Server-sent events, one `song` event per new SongEntry. Event ids are
+    /songs cursors: EventSource resumes via Last-Event-ID, and clients can
+    pass ?since=<latest_cursor> from GET /songs to start without a gap.
+    """
+    resume = last_event_id or since
+    try:
+        after = decode_cursor(resume) if resume else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    # Subscribe before replaying so nothing slips between the two.
+    queue = silo.broadcaster.subscribe()
+
+    async def events():
+        last = after
+        try:
+            while last is not None:
+                entries = await _replay_since(silo, last, STREAM_REPLAY_PAGE)
+                for entry in entries:
+                    yield sse_frame(*song_event(entry))
+                last = (entries[-1].created_at, entries[-1].id) if entries else last
+                if len(entries) < STREAM_REPLAY_PAGE:
+                    break
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=FEED_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    # Dropped as a slow consumer (or shutting down); the
+                    # client reconnects with Last-Event-ID.
+                    return
+                cursor, frame = event
+                if last is not None and cursor <= last:
+                    continue  # already sent during replay
+                yield frame
+        finally:
+            silo.broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/songs", response_model=schemas.SongOut)
-def create_song(song_in: schemas.SongCreate, db: Session = Depends(get_db)):
+async def create_song(
+    song_in: schemas.SongCreate,
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
+):
     # In a real platform you’d validate `user` and use a real identity.
-    return add_song_to_app_playlist(db, song_in)
+    try:
+        return await add_song_to_app_playlist(silo, db, song_in)
+    except UnknownTrackError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/songs/batch", response_model=schemas.SongBatchResult)
+async def create_songs_batch(
+    batch_in: schemas.SongBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    silo: Silo = Depends(get_silo),
+):
+    try:
+        created, existing = await add_songs_to_app_playlist(silo, db, batch_in.items)
+    except UnknownTrackError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return schemas.SongBatchResult(created=created, existing=existing)
+
+
+# ---------- Stats ----------
+# Served from the aggregate tables (see app.stats), so cost doesn't grow with
+# the number of songs.
+
+_artist_stats = TypeAdapter(list[schemas.ArtistStatOut])
+_user_stats = TypeAdapter(list[schemas.UserStatOut])
+_hourly_activity = TypeAdapter(list[schemas.HourlyActivityOut])
+
+
+@app.get("/stats/top-artists", response_model=list[schemas.ArtistStatOut])
+async def stats_top_artists(
+    request: Request,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    silo: Silo = Depends(get_silo),
+):
+    async def build() -> bytes:
+        rows = await crud.top_artists(db, limit)
+        return _artist_stats.dump_json(_artist_stats.validate_python(rows, from_attributes=True))
+
+    return await _feed_cached(request, db, silo, "top-artists", (limit,), build)
+
+
+@app.get("/stats/top-users", response_model=list[schemas.UserStatOut])
+async def stats_top_users(
+    request: Request,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    silo: Silo = Depends(get_silo),
+):
+    async def build() -> bytes:
+        rows = await crud.top_users(db, limit)
+        return _user_stats.dump_json(_user_stats.validate_python(rows, from_attributes=True))
+
+    return await _feed_cached(request, db, silo, "top-users", (limit,), build)
+
+
+@app.get("/stats/activity", response_model=list[schemas.HourlyActivityOut])
+async def stats_activity(
+    request: Request,
+    hours: int = Query(24, ge=1, le=24 * 31),
+    db: AsyncSession = Depends(get_read_db),
+    silo: Silo = Depends(get_silo),
+):
+    """Songs added per UTC hour over the last `hours` hours, oldest first; quiet hours are 0."""
+    current = models.hour_bucket(models.utcnow())
+    start = current - timedelta(hours=hours - 1)
+
+    async def build() -> bytes:
+        counts = {models.hour_bucket(row.hour): row.song_count for row in await crud.hourly_activity(db, start)}
+        series = [
+            schemas.HourlyActivityOut(hour=hour, song_count=counts.get(hour, 0))
+            for hour in (start + timedelta(hours=i) for i in range(hours))
+        ]
+        return _hourly_activity.dump_json(series)
+
+    # The window moves with the clock, so the hour is part of the key.
+    return await _feed_cached(request, db, silo, "activity", (hours, current), build)
+
+
+startup_profile.mark("app_imported")
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Callable, Iterable
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .startup import startup_profile
+
+# Small in-process Prometheus registry. Values are per worker; scrape each
+# worker (or sum them) the way the multiprocess Prometheus client would.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Cap distinct SQL fingerprints so ad-hoc statements can't blow up cardinality.
+MAX_SQL_FINGERPRINTS = 200
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Sync DB/HTTP hooks can fire from threadpool threads.
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self._header()
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        for key, state in items:
+            cumulative = 0.0
+            for le, count in zip(bounds, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {state[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class GaugeCallback(_Metric):
+    """Gauge whose samples are read at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str], read: Callable[[], Iterable[tuple[tuple[str, ...], float]]]):
+        super().__init__(name, help, labelnames)
+        self._read = read
+
+    def render(self) -> list[str]:
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in self._read()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled.", ("method", "route", "status"),
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency (streams: full duration).", ("method", "route"),
+))
+db_query_duration_seconds = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement latency by statement fingerprint.", ("statement",),
+))
+spotify_requests_total = registry.register(Counter(
+    "spotify_requests_total", "Spotify API calls by endpoint and status code.", ("endpoint", "status"),
+))
+spotify_request_duration_seconds = registry.register(Histogram(
+    "spotify_request_duration_seconds", "Spotify API call latency.", ("endpoint",),
+))
+registry.register(GaugeCallback(
+    "startup_phase_seconds", "Seconds from package import to each startup phase.", ("phase",),
+    startup_profile.phase_samples,
+))
+registry.register(GaugeCallback(
+    "startup_import_seconds", "Cumulative import time of app modules and key dependencies.", ("module",),
+    startup_profile.import_samples,
+))
+
+
+# ---------- ASGI middleware ----------
+
+class MetricsMiddleware:
+    """Per-route request count and latency, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            # Raw paths of unmatched requests (scanners, typos) would explode cardinality.
+            route_label = getattr(route, "path", "unmatched")
+            http_requests_total.inc(scope["method"], route_label, status)
+            http_request_duration_seconds.observe(elapsed, scope["method"], route_label)
+            startup_profile.request_finished()
+
+
+# ---------- SQLAlchemy ----------
+
+_WS_RE = re.compile(r"\s+")
+# Expanded IN lists / multi-row VALUES: "(?, ?, ?)" or "($1, $2)" -> "(?)"
+_PARAM_LIST_RE = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|\$\d+|:\w+)\s*,?)+\)")
+_VALUES_RE = re.compile(r"(VALUES\s*\(\?\))(?:\s*,\s*\(\?\))+", re.IGNORECASE)
+# statement text -> fingerprint, and the set of fingerprints handed out
+_fingerprint_cache: dict[str, str] = {}
+_fingerprints: set[str] = set()
+
+
+def statement_fingerprint(statement: str) -> str:
+    cached = _fingerprint_cache.get(statement)
+    if cached is not None:
+        return cached
+    fp = _WS_RE.sub(" ", statement).strip()
+    fp = _PARAM_LIST_RE.sub("(?)", fp)
+    fp = _VALUES_RE.sub(r"\1", fp)
+    fp = fp[:200]
+    if fp not in _fingerprints:
+        if len(_fingerprints) >= MAX_SQL_FINGERPRINTS:
+            fp = "other"
+        else:
+            _fingerprints.add(fp)
+    if len(_fingerprint_cache) > 10_000:
+        _fingerprint_cache.clear()
+    _fingerprint_cache[statement] = fp
+    return fp
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement. Pass `async_engine.sync_engine` for async engines."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        db_query_duration_seconds.observe(time.perf_counter() - start, statement_fingerprint(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+def register_pool_gauges(engine: Engine) -> None:
+    pool = engine.pool
+
+    def read():
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            fn = getattr(pool, name, None)
+            if fn is not None:
+                yield (name,), fn()
+
+    registry.register(GaugeCallback("db_pool_connections", "Connection pool state.", ("state",), read))
+
+
+# ---------- Spotify (httpx transports) ----------
+
+_SPOTIFY_ID_RE = re.compile(r"/(playlists|users|tracks|albums|artists)/[^/]+")
+
+
+def spotify_endpoint(request: httpx.Request) -> str:
+    # /v1/playlists/abc123/tracks -> /v1/playlists/{id}/tracks
+    return _SPOTIFY_ID_RE.sub(r"/\1/{id}", request.url.path)
+
+
+def _record_spotify(request: httpx.Request, status: str, start: float) -> None:
+    endpoint = spotify_endpoint(request)
+    spotify_requests_total.inc(endpoint, status)
+    spotify_request_duration_seconds.observe(time.perf_counter() - start, endpoint)
+
+
+class InstrumentedAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            _record_spotify(request, type(e).__name__, start)
+            raise
+        _record_spotify(request, str(response.status_code), start)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
-from sqlalchemy import String, Integer, DateTime, Text, UniqueConstraint
+from sqlalchemy import String, Integer, DateTime, Text, UniqueConstraint, Index, bindparam, cast, func
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .database import Base
@@ -12,6 +13,11 @@ def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+OUTBOX_PENDING = "pending"
+OUTBOX_SENT = "sent"
+OUTBOX_DEAD = "dead"
+
+
 class PlaylistConfig(Base):
     __tablename__ = "playlist_config"
 
@@ -21,6 +27,9 @@ class PlaylistConfig(Base):
     spotify_refresh_token: Mapped[str | None] = mapped_column(String, nullable=True)
     spotify_access_token: Mapped[str | None] = mapped_column(String, nullable=True)
     spotify_access_token_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Claimed by the worker refreshing the access token (see TokenManager).
+    spotify_refresh_lease_owner: Mapped[str | None] = mapped_column(String, nullable=True)
+    spotify_refresh_lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # Spotify playlist created/linked for this silo
     spotify_playlist_id: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -30,6 +39,9 @@ class PlaylistConfig(Base):
     description: Mapped[str | None] = mapped_column(String, nullable=True)
     cover_image_url: Mapped[str | None] = mapped_column(String, nullable=True)
 
+    # Bumped on every write; workers compare it to invalidate cached copies.
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
 
 
@@ -38,6 +50,8 @@ class SongEntry(Base):
 
     __table_args__ = (
         UniqueConstraint("user", "spotify_track_id", name="uq_songentry_user_spotify_track"),
+        # Keyset pagination for GET /songs walks this index in both directions.
+        Index("ix_song_entries_created_at_id", "created_at", "id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
@@ -55,3 +69,155 @@ class SongEntry(Base):
     comment: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+def _inline(value: str):
+    # Rendered as a literal, so queries repeat the index expression exactly
+    # and the planner can use the index.
+    return bindparam(None, value, literal_execute=True)
+
+
+def _weighted_tsvector(column, weight: str):
+    return func.setweight(
+        func.to_tsvector(cast(_inline("simple"), REGCONFIG), func.coalesce(column, _inline(""))),
+        _inline(weight),
+    )
+
+
+# Full-text document for /songs/search. Titles and artists rank above the
+# submitter, which ranks above comments. Postgres only: SQLite uses the
+# in-memory index in song_index.py instead.
+SONG_SEARCH_VECTOR = (
+    _weighted_tsvector(SongEntry.song, "A")
+    .op("||")(_weighted_tsvector(SongEntry.artist, "A"))
+    .op("||")(_weighted_tsvector(SongEntry.user, "B"))
+    .op("||")(_weighted_tsvector(SongEntry.comment, "C"))
+)
+Index("ix_song_entries_search", SONG_SEARCH_VECTOR, postgresql_using="gin").ddl_if(dialect="postgresql")
+
+
+class FeedState(Base):
+    """
+    Single-row table holding the song feed version, bumped in the same
+    transaction as every SongEntry insert. Used for /songs ETags.
+    """
+    __tablename__ = "feed_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+FEED_STATE_ID = 1
+
+
+class SchemaState(Base):
+    """
+    Fingerprint of the models the schema was last synced for (see
+    schema.ensure_schema), so workers of an unchanged deploy skip reflection.
+    """
+    __tablename__ = "schema_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+
+SCHEMA_STATE_ID = 1
+
+
+class PlaylistOutbox(Base):
+    """
+    Pending "add to Spotify playlist" work, written in the same transaction
+    as the SongEntry and drained in batches by app.outbox.
+    """
+    __tablename__ = "playlist_outbox"
+
+    __table_args__ = (
+        Index("ix_playlist_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    song_entry_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    spotify_track_uri: Mapped[str] = mapped_column(String, nullable=False)
+
+    # pending -> sent, or pending -> dead after too many attempts
+    status: Mapped[str] = mapped_column(String, nullable=False, default=OUTBOX_PENDING)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class PlaylistSyncState(Base):
+    """
+    Where the last playlist reconciliation (app.reconcile) left off: the
+    playlist's snapshot_id once it held every song up to `last_song_id`.
+    """
+    __tablename__ = "playlist_sync_state"
+
+    spotify_playlist_id: Mapped[str] = mapped_column(String, primary_key=True)
+    snapshot_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    last_song_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    synced_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+class Track(Base):
+    """
+    Spotify track metadata seen in search responses or fetched from
+    /tracks, used to validate and fill in song submissions (app.tracks).
+    """
+    __tablename__ = "tracks"
+
+    spotify_track_id: Mapped[str] = mapped_column(String, primary_key=True)
+    spotify_track_uri: Mapped[str] = mapped_column(String, nullable=False)
+
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    # Credited artists, comma-separated, as shown in the feed.
+    artist: Mapped[str] = mapped_column(String, nullable=False)
+    album_art_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    duration_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+# ---------- Aggregates (maintained by crud._record_inserted; see app.stats) ----------
+
+class ArtistStat(Base):
+    __tablename__ = "artist_stats"
+
+    __table_args__ = (
+        Index("ix_artist_stats_song_count", "song_count"),
+    )
+
+    artist: Mapped[str] = mapped_column(String, primary_key=True)
+    song_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_added_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class UserStat(Base):
+    __tablename__ = "user_stats"
+
+    __table_args__ = (
+        Index("ix_user_stats_song_count", "song_count"),
+    )
+
+    user: Mapped[str] = mapped_column(String, primary_key=True)
+    song_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_added_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class HourlyActivity(Base):
+    __tablename__ = "song_activity_hourly"
+
+    # Start of the UTC hour.
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    song_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+def hour_bucket(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from . import crud, models
+from .config_cache import ConfigCache, config_cache
+from .database import SessionLocal
+from .settings import (
+    OUTBOX_POLL_SECONDS,
+    OUTBOX_BATCH_WINDOW_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE_SECONDS,
+    OUTBOX_BACKOFF_MAX_SECONDS,
+)
+from .spotify_client import (
+    add_tracks_to_playlist_async,
+    PLAYLIST_ADD_BATCH_SIZE,
+    SpotifyApiError,
+    SpotifyAuthError,
+    SpotifyUnavailableError,
+)
+from .token_manager import TokenManager, token_manager
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), OUTBOX_BACKOFF_MAX_SECONDS)
+    # Full jitter so rows that failed together don't retry together.
+    return random.uniform(delay / 2, delay)
+
+
+def _mark_sent(rows: list[models.PlaylistOutbox], now: datetime) -> None:
+    for row in rows:
+        row.status = models.OUTBOX_SENT
+        row.attempts += 1
+        row.sent_at = now
+        row.last_error = None
+
+
+def _defer(rows: list[models.PlaylistOutbox], until: datetime) -> None:
+    # Throttled or circuit open: Spotify never saw these, so no attempt is spent.
+    for row in rows:
+        row.next_attempt_at = until
+
+
+def _mark_failed(rows: list[models.PlaylistOutbox], error: str, now: datetime) -> None:
+    for row in rows:
+        row.attempts += 1
+        row.last_error = error
+        if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+            row.status = models.OUTBOX_DEAD
+        else:
+            row.next_attempt_at = now + timedelta(seconds=backoff_delay(row.attempts))
+
+
+def _rejects_items(e: SpotifyApiError) -> bool:
+    # A 4xx about the request body (a malformed or unknown URI). 401/403/404
+    # are about the token or the playlist and would fail any subset too.
+    return e.status_code is not None and 400 <= e.status_code < 500 and e.status_code not in (401, 403, 404, 429)
+
+
+class OutboxDispatcher:
+    """
+    Background task that drains playlist_outbox into Spotify, up to
+    PLAYLIST_ADD_BATCH_SIZE URIs per API call.
+
+    It polls, and is also woken by notify() after a local insert; a short
+    batching window lets a burst of submissions go out as one call.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, config_cache: ConfigCache, token_manager: TokenManager):
+        self._session_factory = session_factory
+        self._config_cache = config_cache
+        self._token_manager = token_manager
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def drain_once(self) -> int:
+        """Send one batch. Returns the number of rows claimed."""
+        async with self._session_factory() as db:
+            now = datetime.now(timezone.utc)
+            rows = await crud.claim_pending_outbox(db, now, PLAYLIST_ADD_BATCH_SIZE)
+            if not rows:
+                return 0
+
+            cfg = await self._config_cache.get(db)
+            if cfg is None or not cfg.spotify_connected or not cfg.spotify_playlist_id:
+                # Not connected yet; leave rows pending without burning attempts.
+                return 0
+
+            handled: set[int] = set()
+            try:
+                access_token = await self._token_manager.get_access_token()
+                await self._send(access_token, cfg.spotify_playlist_id, rows, now, handled)
+            except SpotifyUnavailableError as e:
+                rest = [row for row in rows if row.id not in handled]
+                logger.info("Spotify unavailable; deferring %d outbox rows by %.1fs", len(rest), e.retry_after)
+                _defer(rest, now + timedelta(seconds=e.retry_after))
+                await db.commit()
+                # Stop draining until the next poll; more batches would fail the same way.
+                return 0
+            except (SpotifyAuthError, SpotifyApiError) as e:
+                rest = [row for row in rows if row.id not in handled]
+                logger.warning("Playlist add failed for %d outbox rows: %s", len(rest), e)
+                _mark_failed(rest, str(e), now)
+
+            await db.commit()
+            return len(rows)
+
+    async def _send(
+        self, access_token: str, playlist_id: str, rows: list[models.PlaylistOutbox], now: datetime, handled: set[int]
+    ) -> None:
+        """
+        Add the rows' tracks in one call. If Spotify rejects the payload,
+        bisect so only the offending rows are charged an attempt; the rest
+        go out in the smaller calls. Rows marked sent/failed land in `handled`.
+        """
+        try:
+            await add_tracks_to_playlist_async(access_token, playlist_id, [row.spotify_track_uri for row in rows])
+        except SpotifyApiError as e:
+            if not _rejects_items(e):
+                raise
+            if len(rows) == 1:
+                logger.warning("Spotify rejected outbox row %s (%s): %s", rows[0].id, rows[0].spotify_track_uri, e)
+                _mark_failed(rows, str(e), now)
+                handled.add(rows[0].id)
+                return
+            mid = len(rows) // 2
+            await self._send(access_token, playlist_id, rows[:mid], now, handled)
+            await self._send(access_token, playlist_id, rows[mid:], now, handled)
+        else:
+            _mark_sent(rows, now)
+            handled.update(row.id for row in rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+                await asyncio.sleep(OUTBOX_BATCH_WINDOW_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                while await self.drain_once() == PLAYLIST_ADD_BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("Outbox drain failed")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+outbox_dispatcher = OutboxDispatcher(SessionLocal, config_cache, token_manager)
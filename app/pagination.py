@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+
+# Keyset cursors over (created_at, id). Opaque to clients so the encoding can
+# change without breaking them.
+
+Cursor = tuple[datetime, int]
+
+
+def encode_cursor(created_at: datetime, entry_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), entry_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, entry_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
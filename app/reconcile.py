@@ -0,0 +1,118 @@
+"""
+Playlist reconciliation: make the Spotify playlist hold every submitted
+track. The outbox normally keeps it in sync; this repairs what it missed
+(dead outbox rows, tracks removed by hand, songs submitted before the
+playlist was linked).
+
+    python -m app.reconcile [--full]    (every silo, in multi-silo mode)
+    POST /admin/playlist/reconcile
+
+The playlist's snapshot_id is recorded after each run. If it hasn't changed
+since, the playlist is exactly as we left it, so only songs submitted since
+need checking and the item listing is skipped: a run where nothing changed
+costs one API call. Otherwise items are listed 100 per page and diffed
+against song_entries as sets; missing URIs are added 100 per call.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+
+from . import crud, models
+from .silos import Silo
+from .spotify_client import (
+    add_tracks_to_playlist_async,
+    get_playlist_snapshot_id_async,
+    get_playlist_track_uris_async,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistNotLinkedError(Exception):
+    pass
+
+
+async def reconcile_playlist(silo: Silo, full: bool = False) -> dict:
+    """Add missing tracks to the silo's playlist. `full` ignores the recorded snapshot."""
+    async with silo.session_factory() as db:
+        cfg = await silo.config_cache.get(db)
+        if cfg is None or not cfg.spotify_connected or not cfg.spotify_playlist_id:
+            raise PlaylistNotLinkedError("Playlist or Spotify connection is not fully configured.")
+        playlist_id = cfg.spotify_playlist_id
+
+        access_token = await silo.token_manager.get_access_token()
+        state = await crud.get_playlist_sync_state(db, playlist_id)
+        up_to = await crud.max_song_id(db)
+        snapshot_id = await get_playlist_snapshot_id_async(access_token, playlist_id)
+
+        result = {"mode": "unchanged", "playlist_items": None, "checked": 0, "missing": 0, "added": 0}
+        if not full and state is not None and state.snapshot_id == snapshot_id:
+            if state.last_song_id >= up_to:
+                return result
+            result["mode"] = "incremental"
+            candidates = await crud.song_track_uris(db, state.last_song_id, up_to)
+            present: set[str] = set()
+        else:
+            result["mode"] = "full"
+            candidates = await crud.song_track_uris(db, 0, up_to)
+            present = set(await get_playlist_track_uris_async(access_token, playlist_id))
+            result["playlist_items"] = len(present)
+
+        # The outbox is about to send these; adding them here too would duplicate them.
+        pending = await crud.pending_outbox_uris(db)
+        missing = [uri for uri in candidates if uri not in present and uri not in pending]
+        result.update(checked=len(candidates), missing=len(missing))
+
+        now = models.utcnow()
+        if missing:
+            snapshot_id = await add_tracks_to_playlist_async(access_token, playlist_id, missing) or snapshot_id
+            await crud.mark_dead_outbox_sent(db, missing, now)
+            result["added"] = len(missing)
+
+        if state is None:
+            state = models.PlaylistSyncState(spotify_playlist_id=playlist_id)
+            db.add(state)
+        # With outbox sends in flight the playlist isn't complete up to
+        # `up_to` yet, so don't vouch for this snapshot: next run lists it.
+        skipped_pending = any(uri in pending and uri not in present for uri in candidates)
+        state.snapshot_id = None if skipped_pending else snapshot_id
+        state.last_song_id = up_to
+        state.synced_at = now
+        await db.commit()
+
+    logger.info("Reconciled playlist %s: %s", playlist_id, result)
+    return result
+
+
+async def _main() -> None:
+    from .settings import SILOS_FILE
+    from .spotify_client import close_http_client
+
+    full = "--full" in sys.argv
+    if not SILOS_FILE:
+        from .silos import default_silo
+
+        silos = [default_silo]
+    else:
+        from .silos import load_silo_specs
+
+        silos = [Silo.open(spec) for spec in load_silo_specs(SILOS_FILE)]
+    try:
+        for silo in silos:
+            # Builds the engine; for default_silo this also binds SessionLocal.
+            engine = silo.get_engine()
+            try:
+                await reconcile_playlist(silo, full=full)
+            except PlaylistNotLinkedError as e:
+                logger.info("%s: skipped (%s)", silo.id, e)
+            finally:
+                await engine.dispose()
+    finally:
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,193 @@
+"""
+Read replicas: read-only endpoints take their session from a healthy
+replica, round-robin; writes, token refreshes and background tasks keep
+using the primary (Silo.session_factory).
+
+A client that just wrote gets a short-lived cookie (ReadYourWritesMiddleware)
+and reads from the primary until it expires, so it sees its own changes even
+while replicas lag behind.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from .database import make_engine, make_session_factory
+from .settings import (
+    DATABASE_REPLICA_URLS,
+    FRONTEND_ORIGIN,
+    READ_YOUR_WRITES_SECONDS,
+    REPLICA_HEALTH_CHECK_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+READ_YOUR_WRITES_COOKIE = "read_primary"
+# Session.info flags, for code that must know where its reads come from.
+REPLICA_SESSION = "replica"
+STICKY_SESSION = "read_your_writes"
+
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Seconds since the last replayed transaction, or 0 when the standby has
+# replayed everything it received (an idle primary writes nothing to replay).
+# 0 as well when pointed at a server that isn't a standby.
+_PG_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class Replica:
+    def __init__(self, database_url: str, pool_size: int, max_overflow: int):
+        # For logs and metrics: never the password.
+        self.name = make_url(database_url).render_as_string(hide_password=True)
+        self.engine: AsyncEngine = make_engine(database_url, pool_size=pool_size, max_overflow=max_overflow)
+        self.session_factory = make_session_factory(self.engine)
+        # Unhealthy until the first check passes.
+        self.healthy = False
+        self.lag: float | None = None
+
+    async def check(self, max_lag: float) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float(await conn.scalar(_PG_LAG_SQL) or 0)
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            if self.healthy:
+                logger.warning("Replica %s is down: %s", self.name, e)
+            self.healthy, self.lag = False, None
+            return
+        healthy = lag <= max_lag
+        if healthy != self.healthy:
+            if healthy:
+                logger.info("Replica %s is up (lag %.1fs)", self.name, lag)
+            else:
+                logger.warning("Replica %s is %.1fs behind; skipping it", self.name, lag)
+        self.healthy, self.lag = healthy, lag
+
+
+class ReplicaPool:
+    """
+    The read replicas of one database. A background task re-checks each
+    replica every `check_interval` seconds; session_factory() hands out the
+    healthy ones in turn, or None when none is (callers fall back to the
+    primary).
+    """
+
+    def __init__(
+        self,
+        urls: tuple[str, ...],
+        check_interval: float = REPLICA_HEALTH_CHECK_SECONDS,
+        max_lag: float = REPLICA_MAX_LAG_SECONDS,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+    ):
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.urls = urls
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        # Built in start(): creating an engine loads its driver.
+        self.replicas: list[Replica] = []
+        self._turn = itertools.count()
+        self._task: asyncio.Task | None = None
+
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+
+    def session_factory(self) -> async_sessionmaker | None:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            self.primary_fallbacks += 1
+            return None
+        self.replica_reads += 1
+        return healthy[next(self._turn) % len(healthy)].session_factory
+
+    async def check(self) -> None:
+        await asyncio.gather(*(r.check(self.max_lag) for r in self.replicas))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Replica health check failed")
+            await asyncio.sleep(self.check_interval)
+
+    async def start(self) -> None:
+        if not self.replicas:
+            self.replicas = [Replica(url, self.pool_size, self.max_overflow) for url in self.urls]
+        # One check up front so reads can use replicas from the first request.
+        await self.check()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        replicas, self.replicas = self.replicas, []
+        for replica in replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "healthy": sum(r.healthy for r in self.replicas),
+            "configured": len(self.urls),
+            "replica_reads": self.replica_reads,
+            "primary_fallbacks": self.primary_fallbacks,
+        }
+
+    def lag_samples(self):
+        for replica in self.replicas:
+            if replica.lag is not None:
+                yield (replica.name,), replica.lag
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a successful write request (anything but GET/HEAD/OPTIONS), sets a
+    cookie that sends the client's reads to the primary for
+    READ_YOUR_WRITES_SECONDS.
+    """
+
+    def __init__(self, app, max_age: int = READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        is_https_frontend = (FRONTEND_ORIGIN or "").startswith("https://")
+        # Same attributes as the admin_session cookie, so cross-site FE calls carry it.
+        attrs = [f"{READ_YOUR_WRITES_COOKIE}=1", f"Max-Age={max_age}", "Path=/", "HttpOnly"]
+        attrs += ["SameSite=none", "Secure"] if is_https_frontend else ["SameSite=lax"]
+        self._cookie = "; ".join(attrs).encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in _SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = [*message.get("headers", ()), (b"set-cookie", self._cookie)]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# The default silo's replicas (single-silo mode).
+replica_pool: ReplicaPool | None = ReplicaPool(DATABASE_REPLICA_URLS) if DATABASE_REPLICA_URLS else None
@@ -0,0 +1,146 @@
+"""
+Additive schema management.
+
+Run `python -m app.schema [--force]` as a release step to sync the schema
+(of every silo, in multi-silo mode); with SCHEMA_SYNC_ON_STARTUP=0 workers
+then skip the check entirely.
+Otherwise each worker runs ensure_schema() at startup, which costs one
+fingerprint read when the schema is already current.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sys
+
+from sqlalchemy import Connection, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .database import Base
+from . import models  # noqa: F401  (registers tables on Base.metadata)
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(conn: Connection) -> None:
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            default = column.server_default.arg if column.server_default is not None else None
+            if not column.nullable and default is None:
+                logger.warning("Cannot add NOT NULL column %s.%s without a server default", table.name, column.name)
+                continue
+            ddl = (
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+            )
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+            logger.info("Added column %s.%s", table.name, column.name)
+
+
+def sync_schema(conn: Connection) -> None:
+    """
+    Create missing tables, columns and indexes. Additive only: nothing is
+    altered or dropped.
+
+    Takes a sync Connection; from async code use
+    `await conn.run_sync(sync_schema)`.
+    """
+    Base.metadata.create_all(bind=conn)
+    # create_all skips columns and indexes on tables that already exist.
+    _add_missing_columns(conn)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def schema_fingerprint() -> str:
+    """Hash of the tables, columns and indexes the models declare."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{col.name}:{col.type!r}:{col.nullable}" for col in table.columns)
+        parts.extend(sorted(f"{ix.name}:{[c.name for c in ix.columns]}" for ix in table.indexes))
+    return hashlib.blake2b("\n".join(parts).encode(), digest_size=16).hexdigest()
+
+
+# Arbitrary constant key for pg_advisory_xact_lock; one schema sync at a time.
+SCHEMA_LOCK_KEY = 0x5907_1F1D
+
+
+def _applied_fingerprint(conn: Connection) -> str | None:
+    if not conn.dialect.has_table(conn, models.SchemaState.__tablename__):
+        return None
+    return conn.scalar(
+        select(models.SchemaState.fingerprint).where(models.SchemaState.id == models.SCHEMA_STATE_ID)
+    )
+
+
+def _stamp(conn: Connection, fingerprint: str) -> None:
+    table = models.SchemaState.__table__
+    updated = conn.execute(
+        table.update()
+        .where(table.c.id == models.SCHEMA_STATE_ID)
+        .values(fingerprint=fingerprint, applied_at=models.utcnow())
+    )
+    if updated.rowcount == 0:
+        conn.execute(table.insert().values(id=models.SCHEMA_STATE_ID, fingerprint=fingerprint, applied_at=models.utcnow()))
+
+
+def _sync_if_stale(conn: Connection, force: bool) -> bool:
+    fingerprint = schema_fingerprint()
+    if not force and _applied_fingerprint(conn) == fingerprint:
+        return False
+    if conn.dialect.name == "postgresql":
+        # Workers of a new deploy all get here at once; one syncs, the rest
+        # wait on the lock and then find the fingerprint already stamped.
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        if not force and _applied_fingerprint(conn) == fingerprint:
+            return False
+    sync_schema(conn)
+    _stamp(conn, fingerprint)
+    return True
+
+
+async def ensure_schema(engine: AsyncEngine, force: bool = False) -> bool:
+    """Sync the schema unless it is stamped as current. Returns True if it synced."""
+    async with engine.begin() as conn:
+        synced = await conn.run_sync(_sync_if_stale, force)
+    if synced:
+        logger.info("Schema synced (%s)", schema_fingerprint())
+    return synced
+
+
+async def _main() -> None:
+    from .database import get_engine, make_engine
+    from .settings import SILOS_FILE
+
+    force = "--force" in sys.argv
+    if not SILOS_FILE:
+        engines = {"default": get_engine()}
+    else:
+        from .silos import load_silo_specs
+
+        engines = {spec.id: make_engine(spec.database_url, pool_size=1, max_overflow=0) for spec in load_silo_specs(SILOS_FILE)}
+    for name, engine in engines.items():
+        try:
+            synced = await ensure_schema(engine, force=force)
+            logger.info("%s: %s", name, "synced" if synced else "already current")
+        finally:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
+
+from .images import thumbnail_url
 
 
 class PlaylistConfigStatus(BaseModel):
@@ -41,6 +43,14 @@ class SongCreate(BaseModel):
     comment: str | None = None
 
 
+# Upper bound for POST /songs/batch.
+SONG_BATCH_MAX_ITEMS = 500
+
+
+class SongBatchCreate(BaseModel):
+    items: list[SongCreate] = Field(min_length=1, max_length=SONG_BATCH_MAX_ITEMS)
+
+
 class SongOut(BaseModel):
     id: int
     spotify_track_id: str
@@ -56,5 +66,79 @@ class SongOut(BaseModel):
 
     created_at: datetime
 
+    # Compact copies served by /images; None when the origin isn't proxied
+    # or IMAGE_PROXY_BASE_URL is unset.
+    @computed_field
+    @property
+    def album_art_thumb_url(self) -> str | None:
+        return thumbnail_url(self.album_art_url)
+
+    @computed_field
+    @property
+    def user_avatar_thumb_url(self) -> str | None:
+        return thumbnail_url(self.user_avatar_url)
+
+    class Config:
+        from_attributes = True
+
+
+class SongPage(BaseModel):
+    items: list[SongOut]
+    # Pass as ?cursor= to fetch the next (older) page.
+    next_cursor: str | None = None
+    # Pass as ?since= on the next poll to fetch only newer entries.
+    latest_cursor: str | None = None
+
+
+class SongBatchResult(BaseModel):
+    created: list[SongOut]
+    existing: list[SongOut]
+
+
+class SlimTrack(BaseModel):
+    """A /spotify/search hit. Optional fields appear only when asked for via ?fields=."""
+    id: str
+    uri: str
+    name: str
+    artists: list[str]
+    # Smallest album image that still works as a thumbnail.
+    image: str | None
+
+    album: str | None = None
+    duration_ms: int | None = None
+    explicit: bool | None = None
+    popularity: int | None = None
+    preview_url: str | None = None
+    external_url: str | None = None
+    images: list[str] | None = None
+
+
+class SpotifySearchResult(BaseModel):
+    items: list[SlimTrack]
+    total: int | None = None
+
+
+class ArtistStatOut(BaseModel):
+    artist: str
+    song_count: int
+    last_added_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class UserStatOut(BaseModel):
+    user: str
+    song_count: int
+    last_added_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class HourlyActivityOut(BaseModel):
+    hour: datetime
+    song_count: int
+
     class Config:
         from_attributes = True
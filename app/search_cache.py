@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from .settings import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS
+
+SearchKey = tuple[str, int]
+
+
+def normalize_query(query: str) -> str:
+    # Typeahead sends "Daft  punk", "daft punk " etc.; they are the same search.
+    return " ".join(query.split()).lower()
+
+
+class SearchCache:
+    """
+    Bounded TTL + LRU cache for Spotify search results.
+
+    Concurrent misses on the same key share one in-flight upstream call.
+    Expired entries stay until LRU-evicted so get_stale() can serve them while
+    Spotify is unavailable.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[SearchKey, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[SearchKey, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.stale_served = 0
+
+    def _get_fresh(self, key: SearchKey) -> dict | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: SearchKey) -> dict | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        self.stale_served += 1
+        return item[1]
+
+    def _put(self, key: SearchKey, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: SearchKey, loader: Callable[[], Awaitable[dict]]) -> dict:
+        value = self._get_fresh(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+        except BaseException as e:
+            # Don't cache failures; waiters see the same error.
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved so an un-awaited future doesn't warn
+            raise
+        else:
+            self._put(key, value)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "stale_served": self.stale_served,
+            "inflight": len(self._inflight),
+        }
+
+
+search_cache = SearchCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
@@ -1,37 +1,88 @@
 from __future__ import annotations
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import crud, models, schemas
-from .spotify_client import get_valid_access_token, add_track_to_playlist, SpotifyApiError, SpotifyAuthError
-
-
-def add_song_to_app_playlist(db: Session, song_in: schemas.SongCreate) -> models.SongEntry:
-    existing = crud.find_song_by_user_and_track(db, song_in.user, song_in.spotify_track_id)
-    if existing is not None:
-        return existing
-
-    entry = models.SongEntry(
-        spotify_track_id=song_in.spotify_track_id,
-        spotify_track_uri=song_in.spotify_track_uri,
-        song=song_in.song,
-        artist=song_in.artist,
-        album_art_url=song_in.album_art_url,
-        user=song_in.user,
-        user_avatar_url=song_in.user_avatar_url,
-        comment=song_in.comment,
+from .replicas import REPLICA_SESSION
+from .silos import Silo
+from .song_index import search_terms
+from .spotify_client import get_tracks_async
+from .tracks import TrackFetcher, TrackInfo, UnknownTrackError, track_catalog
+
+
+async def _track_fetcher(silo: Silo, db: AsyncSession) -> TrackFetcher | None:
+    cfg = await silo.config_cache.get(db)
+    if cfg is None or not cfg.spotify_connected:
+        return None
+
+    async def fetch(track_ids: list[str]) -> list[dict | None]:
+        return await get_tracks_async(await silo.token_manager.get_access_token(), track_ids)
+
+    return fetch
+
+
+def _enriched(song_in: schemas.SongCreate, track: TrackInfo | None) -> dict:
+    song = song_in.model_dump()
+    if track is not None:
+        song.update(
+            spotify_track_uri=track.spotify_track_uri,
+            song=track.name or song["song"],
+            artist=track.artist or song["artist"],
+            album_art_url=track.album_art_url or song["album_art_url"],
+        )
+    return song
+
+
+async def add_songs_to_app_playlist(
+    silo: Silo, db: AsyncSession, songs_in: list[schemas.SongCreate]
+) -> tuple[list[models.SongEntry], list[models.SongEntry]]:
+    """
+    Insert submissions in one upsert and return (created, existing).
+
+    Title, artist, art and URI come from the track catalog rather than the
+    client; tracks not seen in a search yet are fetched from Spotify in one
+    batched lookup. Raises UnknownTrackError if Spotify has no such track.
+
+    Spotify adds for the created entries are queued in the same transaction
+    and sent by the outbox dispatcher in one batched call, so this request
+    never waits on Spotify's playlist API.
+    """
+    tracks, unknown = await track_catalog.resolve(
+        db, [song_in.spotify_track_id for song_in in songs_in], await _track_fetcher(silo, db)
+    )
+    if unknown:
+        raise UnknownTrackError(unknown)
+
+    created, existing = await crud.create_songs(
+        db, [_enriched(song_in, tracks.get(song_in.spotify_track_id)) for song_in in songs_in], enqueue_playlist_add=True
     )
-    entry = crud.create_song(db, entry)
-
-    # Best-effort add to Spotify playlist if configured
-    cfg = crud.get_playlist_config(db)
-    if cfg and cfg.spotify_refresh_token and cfg.spotify_playlist_id and song_in.spotify_track_uri:
-        try:
-            access_token = get_valid_access_token(db, cfg)
-            add_track_to_playlist(access_token, cfg.spotify_playlist_id, song_in.spotify_track_uri)
-        except (SpotifyAuthError, SpotifyApiError):
-            # For POC: don't fail the DB write if Spotify is down.
-            # In production: you'd outbox + retry.
-            pass
-
-    return entry
+    if created:
+        silo.feed_cache.invalidate()
+        if any(entry.spotify_track_uri for entry in created):
+            silo.outbox.notify()
+        await silo.broadcaster.publish(created)
+    return created, existing
+
+
+async def add_song_to_app_playlist(silo: Silo, db: AsyncSession, song_in: schemas.SongCreate) -> models.SongEntry:
+    created, existing = await add_songs_to_app_playlist(silo, db, [song_in])
+    return (created or existing)[0]
+
+
+async def search_songs(silo: Silo, db: AsyncSession, query: str, limit: int) -> list[models.SongEntry]:
+    """
+    Prefix search over submitted songs. Postgres answers from its GIN
+    full-text index; other databases from the silo's in-memory index.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if db.bind.dialect.name == "postgresql":
+        return await crud.search_songs_fulltext(db, terms, limit)
+    if db.info.get(REPLICA_SESSION):
+        # The cached version may be ahead of this replica; catch up to what it has.
+        version = await crud.get_feed_version(db)
+    else:
+        version = await silo.feed_cache.current_version(db)
+    await silo.song_index.sync(db, version)
+    return await crud.get_songs_by_ids(db, silo.song_index.search(terms, limit))
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import re
+import tempfile
 from typing import Optional
 
 from dotenv import load_dotenv
@@ -11,11 +12,13 @@ load_dotenv(override=False)
 
 _TEMPLATE_RE = re.compile(r"\{\{([A-Z0-9_]+)\}\}")
 
-def _require(key: str) -> str:
-    val = os.getenv(key)
-    if val is None or val == "":
-        raise RuntimeError(f"Missing required env var: {key}")
-    return val
+# Required vars are checked once at startup (check_required_settings), not at
+# import, so tooling that only imports the package needs no full environment.
+_REQUIRED: list[str] = []
+
+def _require(key: str) -> Optional[str]:
+    _REQUIRED.append(key)
+    return os.getenv(key) or None
 
 def _optional(key: str, default: Optional[str] = None) -> Optional[str]:
     return os.getenv(key, default)
@@ -46,6 +49,25 @@ def _render_templates(value: str, max_passes: int = 3) -> str:
 # ---------------------------------------------------------
 DATABASE_URL = _require("DATABASE_URL")
 
+# Connection pool (ignored for SQLite)
+DB_POOL_SIZE = int(_optional("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(_optional("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(_optional("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(_optional("DB_POOL_RECYCLE", "1800"))
+
+# Read replicas (optional, comma-separated URLs). Read-only endpoints use a
+# healthy one, round-robin; everything else stays on DATABASE_URL.
+DATABASE_REPLICA_URLS = tuple(u.strip() for u in _optional("DATABASE_REPLICA_URLS", "").split(",") if u.strip())
+REPLICA_HEALTH_CHECK_SECONDS = float(_optional("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+# Replicas further behind than this (Postgres replay lag) are skipped.
+REPLICA_MAX_LAG_SECONDS = float(_optional("REPLICA_MAX_LAG_SECONDS", "5"))
+# After a client's own write, its reads go to the primary for this long.
+READ_YOUR_WRITES_SECONDS = int(_optional("READ_YOUR_WRITES_SECONDS", "10"))
+
+# Check/sync the schema when a worker (or silo) starts. Set to 0 when the
+# release step runs `python -m app.schema` instead.
+SCHEMA_SYNC_ON_STARTUP = _optional("SCHEMA_SYNC_ON_STARTUP", "1") == "1"
+
 # ---------------------------------------------------------
 # Admin auth (REQUIRED)
 # ---------------------------------------------------------
@@ -61,6 +83,102 @@ SPOTIFY_CLIENT_SECRET = _require("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = _require("SPOTIFY_REDIRECT_URI")
 SPOTIFY_SCOPES = _require("SPOTIFY_SCOPES")
 
+# ---------------------------------------------------------
+# Spotify HTTP client pool (optional)
+# ---------------------------------------------------------
+SPOTIFY_HTTP_MAX_CONNECTIONS = int(_optional("SPOTIFY_HTTP_MAX_CONNECTIONS", "100"))
+SPOTIFY_HTTP_MAX_KEEPALIVE = int(_optional("SPOTIFY_HTTP_MAX_KEEPALIVE", "20"))
+SPOTIFY_HTTP_KEEPALIVE_EXPIRY = float(_optional("SPOTIFY_HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# ---------------------------------------------------------
+# Spotify rate-limit governor (optional)
+# ---------------------------------------------------------
+SPOTIFY_RATE_LIMIT_PER_SECOND = float(_optional("SPOTIFY_RATE_LIMIT_PER_SECOND", "10"))
+SPOTIFY_RATE_LIMIT_BURST = int(_optional("SPOTIFY_RATE_LIMIT_BURST", "20"))
+SPOTIFY_MAX_CONCURRENCY = int(_optional("SPOTIFY_MAX_CONCURRENCY", "10"))
+SPOTIFY_MAX_RETRIES = int(_optional("SPOTIFY_MAX_RETRIES", "3"))
+SPOTIFY_RETRY_BASE_SECONDS = float(_optional("SPOTIFY_RETRY_BASE_SECONDS", "0.25"))
+# A caller waits at most this long (throttling, Retry-After) before failing fast.
+SPOTIFY_MAX_WAIT_SECONDS = float(_optional("SPOTIFY_MAX_WAIT_SECONDS", "5"))
+SPOTIFY_BREAKER_FAILURE_THRESHOLD = int(_optional("SPOTIFY_BREAKER_FAILURE_THRESHOLD", "5"))
+SPOTIFY_BREAKER_RESET_SECONDS = float(_optional("SPOTIFY_BREAKER_RESET_SECONDS", "30"))
+
+# ---------------------------------------------------------
+# Spotify access-token manager (optional)
+# ---------------------------------------------------------
+TOKEN_REFRESH_MARGIN_SECONDS = int(_optional("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+TOKEN_REFRESH_RETRY_SECONDS = float(_optional("TOKEN_REFRESH_RETRY_SECONDS", "30"))
+
+# ---------------------------------------------------------
+# Playlist outbox dispatcher (optional)
+# ---------------------------------------------------------
+OUTBOX_POLL_SECONDS = float(_optional("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_BATCH_WINDOW_SECONDS = float(_optional("OUTBOX_BATCH_WINDOW_SECONDS", "0.5"))
+OUTBOX_MAX_ATTEMPTS = int(_optional("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(_optional("OUTBOX_BACKOFF_BASE_SECONDS", "2"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(_optional("OUTBOX_BACKOFF_MAX_SECONDS", "600"))
+
+# ---------------------------------------------------------
+# /spotify/search result cache (optional)
+# ---------------------------------------------------------
+SEARCH_CACHE_MAX_ENTRIES = int(_optional("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+SEARCH_CACHE_TTL_SECONDS = float(_optional("SEARCH_CACHE_TTL_SECONDS", "300"))
+
+# ---------------------------------------------------------
+# Spotify track metadata cache (optional; in front of the `tracks` table)
+# ---------------------------------------------------------
+TRACK_CACHE_MAX_ENTRIES = int(_optional("TRACK_CACHE_MAX_ENTRIES", "20000"))
+
+# ---------------------------------------------------------
+# Response compression (optional; brotli needs the `brotli` package)
+# ---------------------------------------------------------
+COMPRESSION_MIN_SIZE = int(_optional("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(_optional("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(_optional("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# ---------------------------------------------------------
+# /images proxy and thumbnail cache (resizing needs Pillow)
+# ---------------------------------------------------------
+IMAGE_CACHE_DIR = _optional("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "spotifind-images"))
+IMAGE_CACHE_MAX_BYTES = int(_optional("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+IMAGE_FETCH_MAX_BYTES = int(_optional("IMAGE_FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+IMAGE_WORKERS = int(_optional("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_THUMB_WIDTHS = tuple(int(w) for w in _optional("IMAGE_THUMB_WIDTHS", "64,160,300").split(","))
+IMAGE_THUMB_DEFAULT_WIDTH = int(_optional("IMAGE_THUMB_DEFAULT_WIDTH", "160"))
+# Origins the proxy may fetch from; a leading "." matches any subdomain.
+IMAGE_PROXY_ALLOWED_HOSTS = tuple(
+    h.strip().lower()
+    for h in _optional("IMAGE_PROXY_ALLOWED_HOSTS", ".scdn.co,.spotifycdn.com,.fbcdn.net,.fbsbx.com").split(",")
+    if h.strip()
+)
+# Absolute base URL of this API (e.g. https://api.example.com) for thumbnail
+# URLs in SongOut; the frontend is served from another origin, so links must
+# be absolute. Unset, the *_thumb_url fields are null.
+IMAGE_PROXY_BASE_URL = _optional("IMAGE_PROXY_BASE_URL", "").rstrip("/")
+
+# ---------------------------------------------------------
+# PlaylistConfig cache (optional)
+# ---------------------------------------------------------
+CONFIG_CACHE_CHECK_SECONDS = float(_optional("CONFIG_CACHE_CHECK_SECONDS", "5"))
+PLAYLIST_CONFIG_MAX_AGE = int(_optional("PLAYLIST_CONFIG_MAX_AGE", "15"))
+
+# ---------------------------------------------------------
+# /songs response cache (optional)
+# ---------------------------------------------------------
+FEED_VERSION_CHECK_SECONDS = float(_optional("FEED_VERSION_CHECK_SECONDS", "1"))
+FEED_CACHE_MAX_ENTRIES = int(_optional("FEED_CACHE_MAX_ENTRIES", "64"))
+
+# ---------------------------------------------------------
+# /songs/stream push feed (optional)
+# ---------------------------------------------------------
+FEED_STREAM_QUEUE_SIZE = int(_optional("FEED_STREAM_QUEUE_SIZE", "100"))
+FEED_STREAM_HEARTBEAT_SECONDS = float(_optional("FEED_STREAM_HEARTBEAT_SECONDS", "15"))
+
+# ---------------------------------------------------------
+# /metrics (optional; when set, scrapers must send "Authorization: Bearer <token>")
+# ---------------------------------------------------------
+METRICS_TOKEN = _optional("METRICS_TOKEN")
+
 # ---------------------------------------------------------
 # Frontend / CORS (REQUIRED-ish)
 # ---------------------------------------------------------
@@ -75,13 +193,33 @@ SILO_NAME = _optional("SILO_NAME", "Local")
 SILO_BASE_URL = _optional("SILO_BASE_URL", "http://127.0.0.1")
 
 # ---------------------------------------------------------
-# Playlist metadata templates (REQUIRED)
+# Multi-silo mode (optional): serve many silos from one process.
+# SILOS_FILE is a JSON list of {"id", "name", "database_url", "hosts"} and
+# optionally "replica_urls".
+# SILO_ROUTING is "host" (Host header / hosts list) or "path" (/s/<id>/...).
 # ---------------------------------------------------------
-PLAYLIST_TITLE_TEMPLATE = f'{SILO_NAME} Playlist'
-PLAYLIST_DESCRIPTION_TEMPLATE = f'A shared playlist for {SILO_NAME}'
-
-def derived_playlist_title() -> str:
-    return _render_templates(PLAYLIST_TITLE_TEMPLATE)
+SILOS_FILE = _optional("SILOS_FILE")
+SILO_ROUTING = _optional("SILO_ROUTING", "host")
+SILO_MAX_OPEN = int(_optional("SILO_MAX_OPEN", "50"))
+SILO_DB_POOL_SIZE = int(_optional("SILO_DB_POOL_SIZE", "2"))
+SILO_DB_MAX_OVERFLOW = int(_optional("SILO_DB_MAX_OVERFLOW", "3"))
 
-def derived_playlist_description() -> str:
-    return _render_templates(PLAYLIST_DESCRIPTION_TEMPLATE)
+# ---------------------------------------------------------
+# Playlist metadata templates (REQUIRED)
+# ---------------------------------------------------------
+PLAYLIST_TITLE_TEMPLATE = '{silo_name} Playlist'
+PLAYLIST_DESCRIPTION_TEMPLATE = 'A shared playlist for {silo_name}'
+
+def derived_playlist_title(silo_name: str = SILO_NAME) -> str:
+    return _render_templates(PLAYLIST_TITLE_TEMPLATE.format(silo_name=silo_name))
+
+def derived_playlist_description(silo_name: str = SILO_NAME) -> str:
+    return _render_templates(PLAYLIST_DESCRIPTION_TEMPLATE.format(silo_name=silo_name))
+
+def check_required_settings() -> None:
+    missing = [key for key in _REQUIRED if not os.getenv(key)]
+    if SILOS_FILE and "DATABASE_URL" in missing:
+        # Multi-silo mode: each silo brings its own database_url.
+        missing.remove("DATABASE_URL")
+    if missing:
+        raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from .broadcast import SongBroadcaster, broadcaster, libpq_url
+from .config_cache import ConfigCache, config_cache
+from .database import SessionLocal, get_engine, make_engine, make_session_factory
+from .feed_cache import FeedCache, feed_cache
+from .outbox import OutboxDispatcher, outbox_dispatcher
+from .replicas import READ_YOUR_WRITES_COOKIE, REPLICA_SESSION, STICKY_SESSION, ReplicaPool, replica_pool
+from .schema import ensure_schema
+from .song_index import SongSearchIndex, song_index
+from .settings import (
+    CONFIG_CACHE_CHECK_SECONDS,
+    FEED_CACHE_MAX_ENTRIES,
+    FEED_STREAM_QUEUE_SIZE,
+    FEED_VERSION_CHECK_SECONDS,
+    SCHEMA_SYNC_ON_STARTUP,
+    SILO_DB_MAX_OVERFLOW,
+    SILO_DB_POOL_SIZE,
+    SILO_ID,
+    SILO_MAX_OPEN,
+    SILO_NAME,
+    SILO_ROUTING,
+    SILOS_FILE,
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    TOKEN_REFRESH_RETRY_SECONDS,
+    derived_playlist_description,
+    derived_playlist_title,
+)
+from .token_manager import TokenManager, token_manager
+
+logger = logging.getLogger(__name__)
+
+# Served without a silo in multi-silo mode. The OAuth callback finds its silo
+# from `state`, since Spotify only redirects to the one registered URI; the
+# image cache is shared by all silos.
+SILO_EXEMPT_PATHS = ("/health", "/metrics", "/admin/spotify/callback", "/images")
+SILO_PATH_PREFIX = "/s/"
+
+
+@dataclass(frozen=True, slots=True)
+class SiloSpec:
+    id: str
+    name: str
+    database_url: str
+    hosts: tuple[str, ...] = ()
+    replica_urls: tuple[str, ...] = ()
+
+
+@dataclass(eq=False)
+class Silo:
+    """Everything that is per silo: its database and the caches/tasks on top."""
+    id: str
+    name: str
+    # Returns the silo's engine, creating it on first call.
+    get_engine: Callable[[], AsyncEngine]
+    session_factory: async_sessionmaker
+    config_cache: ConfigCache
+    feed_cache: FeedCache
+    token_manager: TokenManager
+    outbox: OutboxDispatcher
+    broadcaster: SongBroadcaster
+    # Used for /songs/search on databases without full-text indexes.
+    song_index: SongSearchIndex
+    # Read replicas for read-only endpoints (see get_read_db), if any.
+    replicas: ReplicaPool | None = None
+    # Requests currently using the silo; busy silos are never evicted.
+    active: int = field(default=0)
+
+    @classmethod
+    def open(cls, spec: SiloSpec) -> "Silo":
+        silo_engine = make_engine(spec.database_url, pool_size=SILO_DB_POOL_SIZE, max_overflow=SILO_DB_MAX_OVERFLOW)
+        session_factory = make_session_factory(silo_engine)
+        silo_config_cache = ConfigCache(check_interval=CONFIG_CACHE_CHECK_SECONDS)
+        silo_feed_cache = FeedCache(check_interval=FEED_VERSION_CHECK_SECONDS, max_entries=FEED_CACHE_MAX_ENTRIES)
+        silo_token_manager = TokenManager(
+            session_factory,
+            silo_config_cache,
+            refresh_margin=timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS),
+            retry_delay=TOKEN_REFRESH_RETRY_SECONDS,
+        )
+        return cls(
+            id=spec.id,
+            name=spec.name,
+            get_engine=lambda: silo_engine,
+            session_factory=session_factory,
+            config_cache=silo_config_cache,
+            feed_cache=silo_feed_cache,
+            token_manager=silo_token_manager,
+            outbox=OutboxDispatcher(session_factory, silo_config_cache, silo_token_manager),
+            broadcaster=SongBroadcaster(
+                queue_size=FEED_STREAM_QUEUE_SIZE,
+                pg_url=libpq_url(spec.database_url),
+                session_factory=session_factory,
+                feed_cache=silo_feed_cache,
+            ),
+            song_index=SongSearchIndex(),
+            replicas=ReplicaPool(
+                spec.replica_urls, pool_size=SILO_DB_POOL_SIZE, max_overflow=SILO_DB_MAX_OVERFLOW
+            ) if spec.replica_urls else None,
+        )
+
+    def playlist_title(self) -> str:
+        return derived_playlist_title(self.name)
+
+    def playlist_description(self) -> str:
+        return derived_playlist_description(self.name)
+
+    async def start(self) -> None:
+        engine = self.get_engine()
+        if SCHEMA_SYNC_ON_STARTUP:
+            await ensure_schema(engine)
+        self.token_manager.start()
+        self.outbox.start()
+        self.broadcaster.start()
+        if self.replicas is not None:
+            await self.replicas.start()
+
+    async def stop(self) -> None:
+        if self.replicas is not None:
+            await self.replicas.stop()
+        await self.broadcaster.stop()
+        await self.outbox.stop()
+        await self.token_manager.stop()
+        await self.get_engine().dispose()
+
+
+# The silo this process serves in single-silo mode: the module singletons.
+default_silo = Silo(
+    id=SILO_ID,
+    name=SILO_NAME,
+    get_engine=get_engine,
+    session_factory=SessionLocal,
+    config_cache=config_cache,
+    feed_cache=feed_cache,
+    token_manager=token_manager,
+    outbox=outbox_dispatcher,
+    broadcaster=broadcaster,
+    song_index=song_index,
+    replicas=replica_pool,
+)
+
+
+def load_silo_specs(path: str) -> list[SiloSpec]:
+    with open(path) as f:
+        entries = json.load(f)
+    return [
+        SiloSpec(
+            id=entry["id"],
+            name=entry.get("name") or entry["id"],
+            database_url=entry["database_url"],
+            hosts=tuple(host.lower() for host in entry.get("hosts", ())),
+            replica_urls=tuple(entry.get("replica_urls", ())),
+        )
+        for entry in entries
+    ]
+
+
+class SiloRegistry:
+    """
+    Open silos keyed by id, created on first use and kept LRU-bounded at
+    `max_open`. Evicting a silo stops its background tasks and disposes its
+    connection pool; the next request for it simply reopens it.
+    """
+
+    def __init__(self, specs: list[SiloSpec], max_open: int):
+        self.max_open = max_open
+        self._specs = {spec.id: spec for spec in specs}
+        self._hosts = {host: spec.id for spec in specs for host in spec.hosts}
+        self._open: OrderedDict[str, Silo] = OrderedDict()
+        self._opening: dict[str, asyncio.Task] = {}
+
+        self.opened = 0
+        self.evicted = 0
+
+    @property
+    def has_replicas(self) -> bool:
+        return any(spec.replica_urls for spec in self._specs.values())
+
+    def __contains__(self, silo_id: str) -> bool:
+        return silo_id in self._specs
+
+    def silo_id_for_host(self, host: str) -> str | None:
+        host = host.split(":", 1)[0].lower()
+        silo_id = self._hosts.get(host)
+        if silo_id is None:
+            # Fall back to the first label: "<silo>.example.com".
+            label = host.split(".", 1)[0]
+            silo_id = label if label in self._specs else None
+        return silo_id
+
+    async def get(self, silo_id: str) -> Silo:
+        silo = self._open.get(silo_id)
+        if silo is not None:
+            self._open.move_to_end(silo_id)
+            return silo
+
+        # Concurrent first requests for a silo share one open.
+        task = self._opening.get(silo_id)
+        if task is None:
+            spec = self._specs[silo_id]
+            task = self._opening[silo_id] = asyncio.create_task(self._open_silo(spec))
+        return await asyncio.shield(task)
+
+    async def _open_silo(self, spec: SiloSpec) -> Silo:
+        started = time.perf_counter()
+        silo = Silo.open(spec)
+        try:
+            await silo.start()
+        except BaseException:
+            await silo.stop()
+            raise
+        finally:
+            self._opening.pop(spec.id, None)
+        self._open[spec.id] = silo
+        self.opened += 1
+        logger.info("Opened silo %s in %.0f ms", spec.id, (time.perf_counter() - started) * 1000)
+        await self._evict(keep=spec.id)
+        return silo
+
+    async def _evict(self, keep: str) -> None:
+        while len(self._open) > self.max_open:
+            victim = next((s for s in self._open.values() if s.active == 0 and s.id != keep), None)
+            if victim is None:
+                # Everything is busy (e.g. open streams); run over the limit for now.
+                return
+            del self._open[victim.id]
+            self.evicted += 1
+            logger.info("Evicting silo %s", victim.id)
+            await victim.stop()
+
+    async def close(self) -> None:
+        for task in list(self._opening.values()):
+            task.cancel()
+        while self._open:
+            _, silo = self._open.popitem(last=False)
+            await silo.stop()
+
+    def stats(self) -> dict:
+        return {
+            "known": len(self._specs),
+            "open": len(self._open),
+            "max_open": self.max_open,
+            "opened": self.opened,
+            "evicted": self.evicted,
+        }
+
+
+silo_registry: SiloRegistry | None = (
+    SiloRegistry(load_silo_specs(SILOS_FILE), max_open=SILO_MAX_OPEN) if SILOS_FILE else None
+)
+
+
+class SiloMiddleware:
+    """
+    Multi-silo mode: resolves the request's silo from the Host header or a
+    /s/<silo_id> path prefix (which is stripped) and stores it in
+    scope["silo"]. Unknown silos get a 404.
+    """
+
+    def __init__(self, app, registry: SiloRegistry, routing: str = SILO_ROUTING):
+        self.app = app
+        self.registry = registry
+        self.routing = routing
+
+    def _resolve(self, scope) -> str | None:
+        if self.routing == "path":
+            path = scope["path"]
+            if not path.startswith(SILO_PATH_PREFIX):
+                return None
+            silo_id, _, rest = path[len(SILO_PATH_PREFIX):].partition("/")
+            if silo_id not in self.registry:
+                return None
+            prefix = SILO_PATH_PREFIX + silo_id
+            scope["path"] = "/" + rest
+            scope["root_path"] = scope.get("root_path", "") + prefix
+            return silo_id
+        for name, value in scope["headers"]:
+            if name == b"host":
+                return self.registry.silo_id_for_host(value.decode("latin-1"))
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        silo_id = self._resolve(scope)
+        if silo_id is None:
+            if scope["path"] in SILO_EXEMPT_PATHS:
+                await self.app(scope, receive, send)
+                return
+            await _not_found(send)
+            return
+
+        silo = await self.registry.get(silo_id)
+        scope["silo"] = silo
+        silo.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            silo.active -= 1
+
+
+async def _not_found(send) -> None:
+    body = b'{"detail":"Unknown silo."}'
+    await send({
+        "type": "http.response.start",
+        "status": 404,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def get_silo(request: Request) -> Silo:
+    return request.scope.get("silo", default_silo)
+
+
+async def get_db(silo: Silo = Depends(get_silo)):
+    async with silo.session_factory() as db:
+        yield db
+
+
+async def get_read_db(request: Request, silo: Silo = Depends(get_silo)):
+    """
+    Session for read-only endpoints: a healthy replica, or the primary when
+    there is none or the client wrote recently (read-your-writes cookie).
+    Never write through it.
+    """
+    sticky = READ_YOUR_WRITES_COOKIE in request.cookies
+    factory = None
+    if silo.replicas is not None and not sticky:
+        factory = silo.replicas.session_factory()
+    async with (factory or silo.session_factory)() as db:
+        if factory is not None:
+            db.info[REPLICA_SESSION] = True
+        elif sticky:
+            db.info[STICKY_SESSION] = True
+        yield db
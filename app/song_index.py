@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import heapq
+import re
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+
+_TOKEN_RE = re.compile(r"\w+")
+MAX_QUERY_TERMS = 8
+
+# song, artist, user, comment: Postgres' default ts_rank weights for the
+# A/A/B/C labels in models.SONG_SEARCH_VECTOR, so both backends rank alike.
+FIELD_WEIGHTS = (1.0, 1.0, 0.4, 0.2)
+# A prefix hit ("daf" -> "daft") counts a little less than a whole word.
+PREFIX_FACTOR = 0.8
+
+
+def search_terms(query: str) -> list[str]:
+    return _TOKEN_RE.findall(query.lower())[:MAX_QUERY_TERMS]
+
+
+class SongSearchIndex:
+    """
+    In-memory inverted index over song entries, for databases without
+    full-text indexes (SQLite).
+
+    Built on the first search, then caught up from the highest indexed id
+    whenever the feed version moves, so entries inserted by any worker show
+    up. Every term is a prefix; all terms must match.
+    """
+
+    def __init__(self):
+        # token -> {entry id: weight}
+        self._postings: dict[str, dict[int, float]] = {}
+        # Sorted tokens for prefix ranges; rebuilt lazily after new tokens.
+        self._tokens: list[str] = []
+        self._tokens_dirty = False
+        self._max_id = 0
+        self._version: int | None = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, entry_id: int, song: str | None, artist: str | None, user: str | None, comment: str | None) -> None:
+        for text, weight in zip((song, artist, user, comment), FIELD_WEIGHTS):
+            if not text:
+                continue
+            for token in set(_TOKEN_RE.findall(text.lower())):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._tokens_dirty = True
+                postings[entry_id] = postings.get(entry_id, 0.0) + weight
+        self._max_id = max(self._max_id, entry_id)
+
+    async def sync(self, db: AsyncSession, version: int) -> None:
+        if version == self._version:
+            return
+        async with self._lock:
+            if version == self._version:
+                return
+            async for row in crud.iter_song_search_docs(db, self._max_id):
+                self.add(*row)
+            self._version = version
+
+    def _matches(self, term: str) -> dict[int, float]:
+        if self._tokens_dirty:
+            self._tokens = sorted(self._postings)
+            self._tokens_dirty = False
+        scores: dict[int, float] = {}
+        i = bisect.bisect_left(self._tokens, term)
+        while i < len(self._tokens) and self._tokens[i].startswith(term):
+            token = self._tokens[i]
+            factor = 1.0 if token == term else PREFIX_FACTOR
+            for entry_id, weight in self._postings[token].items():
+                score = weight * factor
+                if score > scores.get(entry_id, 0.0):
+                    scores[entry_id] = score
+            i += 1
+        return scores
+
+    def search(self, terms: list[str], limit: int) -> list[int]:
+        """Matching entry ids, best first; ties go to the newest entry."""
+        if not terms:
+            return []
+        result: dict[int, float] | None = None
+        # Longest terms first: they tend to match the fewest entries.
+        for term in sorted(terms, key=len, reverse=True):
+            matches = self._matches(term)
+            if result is None:
+                result = matches
+            else:
+                result = {i: score + matches[i] for i, score in result.items() if i in matches}
+            if not result:
+                return []
+        return heapq.nlargest(limit, result, key=lambda i: (result[i], i))
+
+
+song_index = SongSearchIndex()
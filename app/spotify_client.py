@@ -1,13 +1,31 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlencode
 
 import httpx
-from sqlalchemy.orm import Session
 
-from . import models
-from .settings import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI, SPOTIFY_SCOPES
+from .metrics import InstrumentedAsyncTransport
+from .settings import (
+    SPOTIFY_CLIENT_ID,
+    SPOTIFY_CLIENT_SECRET,
+    SPOTIFY_REDIRECT_URI,
+    SPOTIFY_SCOPES,
+    SPOTIFY_HTTP_MAX_CONNECTIONS,
+    SPOTIFY_HTTP_MAX_KEEPALIVE,
+    SPOTIFY_HTTP_KEEPALIVE_EXPIRY,
+    SPOTIFY_RATE_LIMIT_PER_SECOND,
+    SPOTIFY_RATE_LIMIT_BURST,
+    SPOTIFY_MAX_CONCURRENCY,
+    SPOTIFY_MAX_RETRIES,
+    SPOTIFY_RETRY_BASE_SECONDS,
+    SPOTIFY_MAX_WAIT_SECONDS,
+    SPOTIFY_BREAKER_FAILURE_THRESHOLD,
+    SPOTIFY_BREAKER_RESET_SECONDS,
+)
 
 SPOTIFY_AUTH_URL = "https://accounts.spotify.com/authorize"
 SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
@@ -19,7 +37,253 @@ class SpotifyAuthError(Exception):
 
 
 class SpotifyApiError(Exception):
-    pass
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        # Spotify's HTTP status, where the caller can act on it.
+        self.status_code = status_code
+
+
+class SpotifyUnavailableError(SpotifyApiError):
+    """Spotify is throttling us or degraded; try again after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ---------- Shared async HTTP client ----------
+# One pooled client per process, created on first use and closed by the
+# FastAPI lifespan, so hot paths reuse keep-alive (HTTP/2) connections instead
+# of a fresh TLS handshake per call.
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=SPOTIFY_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=SPOTIFY_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=SPOTIFY_HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = InstrumentedAsyncTransport(httpx.AsyncHTTPTransport(http2=True, limits=limits))
+    return httpx.AsyncClient(transport=transport, timeout=10)
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+# ---------- Rate-limit governor ----------
+# Spotify's Web API limit is per app, so every worker task shares one budget.
+# Calls are paced by a token bucket, capped by a semaphore, paused for
+# Retry-After when Spotify answers 429, and short-circuited while Spotify
+# keeps failing, so a throttled API sheds load instead of being hammered.
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long the caller must wait before using it."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        # Going negative queues callers behind each other in arrival order.
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self) -> None:
+        self._tokens += 1
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. Once `reset_timeout`
+    has passed, a single probe call is let through; its outcome closes the
+    circuit or re-opens it for another timeout.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> float:
+        """0 if a call may go ahead, otherwise seconds until one may."""
+        if self._opened_at is None:
+            return 0.0
+        remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0:
+            return remaining
+        if self._probing:
+            return min(1.0, self.reset_timeout)
+        self._probing = True
+        return 0.0
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon(self) -> None:
+        # A probe that never reached Spotify (cancelled, gave up waiting) says
+        # nothing about its health; let the next caller probe instead.
+        self._probing = False
+
+
+def _retry_after(resp: httpx.Response) -> float:
+    value = resp.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return 1.0
+
+
+class SpotifyGovernor:
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        max_retries: int,
+        retry_base: float,
+        max_wait: float,
+        breaker: CircuitBreaker,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.max_wait = max_wait
+        self.breaker = breaker
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._paused_until = 0.0
+        self.inflight = 0
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _admit(self, max_wait: float) -> None:
+        blocked = self.breaker.allow()
+        if blocked:
+            raise SpotifyUnavailableError("Spotify is unavailable (circuit open)", retry_after=blocked)
+
+        paused = max(0.0, self._paused_until - time.monotonic())
+        wait = max(paused, self.bucket.reserve())
+        if wait > max_wait:
+            self.bucket.refund()
+            self.breaker.abandon()
+            raise SpotifyUnavailableError("Spotify rate limit reached", retry_after=wait)
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def request(
+        self, method: str, url: str, *, idempotent: bool, max_wait: float | None = None, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a governed request. 429s are always retried (Spotify did not act
+        on them); 5xx and transport errors only when `idempotent`. Raises
+        SpotifyUnavailableError when throttling or the breaker rules out a
+        timely answer; other non-2xx responses are returned to the caller.
+        `max_wait` overrides how long to wait for a turn (background jobs
+        pass BACKGROUND_MAX_WAIT rather than failing fast).
+        """
+        if max_wait is None:
+            max_wait = self.max_wait
+        attempt = 0
+        while True:
+            await self._admit(max_wait)
+            try:
+                async with self._semaphore:
+                    self.inflight += 1
+                    try:
+                        resp = await get_http_client().request(method, url, **kwargs)
+                    finally:
+                        self.inflight -= 1
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    raise SpotifyApiError(f"Spotify request failed: {e!r}") from e
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            else:
+                if resp.status_code == 429:
+                    retry_after = _retry_after(resp)
+                    self._pause(retry_after)
+                    self.breaker.record_failure()
+                    if attempt >= self.max_retries:
+                        raise SpotifyUnavailableError("Spotify rate limit reached", retry_after=retry_after)
+                    # _admit() waits out the pause, or fails fast if it is longer than max_wait.
+                    attempt += 1
+                    continue
+                if resp.status_code < 500:
+                    self.breaker.record_success()
+                    return resp
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    return resp
+
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** attempt)))
+
+    def stats(self) -> dict:
+        return {
+            "circuit_open": int(self.breaker.is_open),
+            "consecutive_failures": self.breaker.failures,
+            "paused_seconds": max(0.0, self._paused_until - time.monotonic()),
+            "bucket_tokens": self.bucket.tokens,
+            "inflight": self.inflight,
+        }
+
+
+# Background jobs have no one waiting on them: they queue for their turn
+# instead of failing fast like interactive requests.
+BACKGROUND_MAX_WAIT = float("inf")
+
+governor = SpotifyGovernor(
+    rate=SPOTIFY_RATE_LIMIT_PER_SECOND,
+    burst=SPOTIFY_RATE_LIMIT_BURST,
+    max_concurrency=SPOTIFY_MAX_CONCURRENCY,
+    max_retries=SPOTIFY_MAX_RETRIES,
+    retry_base=SPOTIFY_RETRY_BASE_SECONDS,
+    max_wait=SPOTIFY_MAX_WAIT_SECONDS,
+    breaker=CircuitBreaker(SPOTIFY_BREAKER_FAILURE_THRESHOLD, SPOTIFY_BREAKER_RESET_SECONDS),
+)
 
 
 def _get_spotify_client_settings():
@@ -41,7 +305,7 @@ def build_spotify_authorize_url(state: str) -> str:
     return f"{SPOTIFY_AUTH_URL}?{urlencode(params)}"
 
 
-def exchange_code_for_tokens(code: str) -> dict:
+async def exchange_code_for_tokens_async(code: str) -> dict:
     client_id, client_secret, redirect_uri = _get_spotify_client_settings()
 
     data = {
@@ -52,14 +316,14 @@ def exchange_code_for_tokens(code: str) -> dict:
         "client_secret": client_secret,
     }
 
-    resp = httpx.post(SPOTIFY_TOKEN_URL, data=data, timeout=10)
+    resp = await get_http_client().post(SPOTIFY_TOKEN_URL, data=data)
     if resp.status_code != 200:
         raise SpotifyAuthError(f"Token exchange failed: {resp.status_code} {resp.text}")
 
     return resp.json()
 
 
-def refresh_access_token(refresh_token: str) -> dict:
+async def refresh_access_token_async(refresh_token: str) -> dict:
     client_id, client_secret, _ = _get_spotify_client_settings()
 
     data = {
@@ -69,68 +333,119 @@ def refresh_access_token(refresh_token: str) -> dict:
         "client_secret": client_secret,
     }
 
-    resp = httpx.post(SPOTIFY_TOKEN_URL, data=data, timeout=10)
+    resp = await get_http_client().post(SPOTIFY_TOKEN_URL, data=data)
     if resp.status_code != 200:
         raise SpotifyAuthError(f"Refresh failed: {resp.status_code} {resp.text}")
 
     return resp.json()
 
 
-def get_valid_access_token(db: Session, cfg: models.PlaylistConfig) -> str:
-    if not cfg.spotify_refresh_token:
-        raise SpotifyAuthError("No refresh token stored")
-
-    now = datetime.now(timezone.utc)
-    if cfg.spotify_access_token and cfg.spotify_access_token_expires_at:
-        # refresh ~60s early
-        if cfg.spotify_access_token_expires_at - now > timedelta(seconds=60):
-            return cfg.spotify_access_token
-
-    token_data = refresh_access_token(cfg.spotify_refresh_token)
-    access_token = token_data.get("access_token")
-    expires_in = int(token_data.get("expires_in", 3600))
-
-    if not access_token:
-        raise SpotifyAuthError("Refresh response missing access_token")
-
-    cfg.spotify_access_token = access_token
-    cfg.spotify_access_token_expires_at = now + timedelta(seconds=expires_in)
-    db.add(cfg)
-    db.commit()
-    db.refresh(cfg)
-
-    return access_token
-
-
-def get_user_profile(access_token: str) -> dict:
+async def get_user_profile_async(access_token: str) -> dict:
     headers = {"Authorization": f"Bearer {access_token}"}
-    resp = httpx.get(f"{SPOTIFY_API_BASE}/me", headers=headers, timeout=10)
+    resp = await governor.request("GET", f"{SPOTIFY_API_BASE}/me", idempotent=True, headers=headers)
     if resp.status_code != 200:
         raise SpotifyApiError(f"Get profile failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 
-def create_playlist_for_user(access_token: str, user_id: str, name: str, description: str) -> dict:
+async def create_playlist_for_user_async(access_token: str, user_id: str, name: str, description: str) -> dict:
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
     payload = {"name": name, "description": description, "public": False}
-    resp = httpx.post(f"{SPOTIFY_API_BASE}/users/{user_id}/playlists", headers=headers, json=payload, timeout=10)
+    resp = await governor.request(
+        "POST", f"{SPOTIFY_API_BASE}/users/{user_id}/playlists", idempotent=False, headers=headers, json=payload
+    )
     if resp.status_code not in (200, 201):
         raise SpotifyApiError(f"Create playlist failed: {resp.status_code} {resp.text}")
     return resp.json()
 
 
-def add_track_to_playlist(access_token: str, playlist_id: str, track_uri: str) -> None:
+# Spotify accepts at most 100 URIs per "add items to playlist" call.
+PLAYLIST_ADD_BATCH_SIZE = 100
+
+
+async def add_tracks_to_playlist_async(access_token: str, playlist_id: str, track_uris: list[str]) -> str | None:
+    """Returns the playlist's snapshot_id after the last batch."""
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-    payload = {"uris": [track_uri]}
-    resp = httpx.post(f"{SPOTIFY_API_BASE}/playlists/{playlist_id}/tracks", headers=headers, json=payload, timeout=10)
-    if resp.status_code not in (200, 201):
-        raise SpotifyApiError(f"Add track failed: {resp.status_code} {resp.text}")
+    snapshot_id = None
+    for i in range(0, len(track_uris), PLAYLIST_ADD_BATCH_SIZE):
+        payload = {"uris": track_uris[i:i + PLAYLIST_ADD_BATCH_SIZE]}
+        resp = await governor.request(
+            "POST", f"{SPOTIFY_API_BASE}/playlists/{playlist_id}/tracks", idempotent=False, headers=headers, json=payload
+        )
+        if resp.status_code not in (200, 201):
+            raise SpotifyApiError(f"Add tracks failed: {resp.status_code} {resp.text}", status_code=resp.status_code)
+        snapshot_id = resp.json().get("snapshot_id")
+    return snapshot_id
+
 
+# Spotify returns at most 100 playlist items per page.
+PLAYLIST_ITEMS_PAGE_SIZE = 100
 
-def search_tracks(access_token: str, query: str, limit: int = 10) -> dict:
+
+async def get_playlist_snapshot_id_async(access_token: str, playlist_id: str) -> str | None:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    resp = await governor.request(
+        "GET", f"{SPOTIFY_API_BASE}/playlists/{playlist_id}", idempotent=True, headers=headers,
+        params={"fields": "snapshot_id"},
+    )
+    if resp.status_code != 200:
+        raise SpotifyApiError(f"Get playlist failed: {resp.status_code} {resp.text}")
+    return resp.json().get("snapshot_id")
+
+
+async def get_playlist_track_uris_async(access_token: str, playlist_id: str) -> list[str]:
+    """
+    URIs of every item in the playlist. Pages are fetched one at a time and
+    wait for the governor rather than failing fast: this is a background
+    listing that can run to hundreds of pages, and holding a single token at
+    a time leaves the rest of the budget to interactive calls.
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    uris: list[str] = []
+    offset, total = 0, 1
+    while offset < total:
+        params = {"fields": "total,items(track(uri))", "limit": PLAYLIST_ITEMS_PAGE_SIZE, "offset": offset}
+        resp = await governor.request(
+            "GET", f"{SPOTIFY_API_BASE}/playlists/{playlist_id}/tracks", idempotent=True,
+            max_wait=BACKGROUND_MAX_WAIT, headers=headers, params=params,
+        )
+        if resp.status_code != 200:
+            raise SpotifyApiError(f"Get playlist items failed: {resp.status_code} {resp.text}")
+        page = resp.json()
+        items = page.get("items") or ()
+        uris.extend(item["track"]["uri"] for item in items if item.get("track") and item["track"].get("uri"))
+        total = page.get("total", 0)
+        if not items:
+            break
+        offset += PLAYLIST_ITEMS_PAGE_SIZE
+    return uris
+
+
+async def search_tracks_async(access_token: str, query: str, limit: int = 10) -> dict:
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"q": query, "type": "track", "limit": limit}
-    resp = httpx.get(f"{SPOTIFY_API_BASE}/search", headers=headers, params=params, timeout=10)
+    resp = await governor.request("GET", f"{SPOTIFY_API_BASE}/search", idempotent=True, headers=headers, params=params)
     if resp.status_code != 200:
         raise SpotifyApiError(f"Spotify search failed: {resp.status_code} {resp.text}")
     return resp.json()
+
+
+# Spotify accepts at most 50 ids per "get several tracks" call.
+TRACKS_BATCH_SIZE = 50
+
+
+async def get_tracks_async(access_token: str, track_ids: list[str]) -> list[dict | None]:
+    """Track objects in `track_ids` order; None where Spotify has no such track."""
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def fetch_batch(batch: list[str]) -> list[dict | None]:
+        params = {"ids": ",".join(batch)}
+        resp = await governor.request("GET", f"{SPOTIFY_API_BASE}/tracks", idempotent=True, headers=headers, params=params)
+        if resp.status_code != 200:
+            raise SpotifyApiError(f"Get tracks failed: {resp.status_code} {resp.text}")
+        return resp.json().get("tracks") or []
+
+    batches = await asyncio.gather(*(
+        fetch_batch(track_ids[i:i + TRACKS_BATCH_SIZE]) for i in range(0, len(track_ids), TRACKS_BATCH_SIZE)
+    ))
+    return [track for batch in batches for track in batch]
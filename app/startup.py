@@ -0,0 +1,121 @@
+"""
+Cold-start profile: import time per module, startup phases and time to first
+request, all measured from when the `app` package was first imported.
+
+Logged once as JSON when the first request completes, and exported on
+/metrics as startup_phase_seconds / startup_import_seconds.
+"""
+from __future__ import annotations
+
+import importlib.abc
+import json
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Third-party packages worth seeing individually; everything under app.* is
+# always timed. Times are cumulative (they include nested imports).
+TRACKED_PACKAGES = (
+    "fastapi", "starlette", "pydantic", "sqlalchemy", "httpx", "h2",
+    "psycopg", "aiosqlite", "jwt", "dotenv",
+)
+
+
+def _tracked(name: str) -> bool:
+    return name == "app" or name.startswith("app.") or name in TRACKED_PACKAGES
+
+
+class _TimedLoader:
+    """Delegates to the real loader, timing exec_module."""
+
+    def __init__(self, loader, name: str, profile: "StartupProfile"):
+        self._loader = loader
+        self._name = name
+        self._profile = profile
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profile.imports[self._name] = time.perf_counter() - start
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self, profile: "StartupProfile"):
+        self._profile = profile
+
+    def find_spec(self, fullname, path, target=None):
+        if not _tracked(fullname):
+            return None
+        # Ask the rest of sys.meta_path, skipping ourselves.
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname, self._profile)
+                return spec
+        return None
+
+
+class StartupProfile:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.imports: dict[str, float] = {}
+        self.phases: dict[str, float] = {}
+        self.first_request: float | None = None
+        self._timer: _ImportTimer | None = None
+
+    def install_import_timer(self) -> None:
+        if self._timer is None:
+            self._timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._timer)
+
+    def _remove_import_timer(self) -> None:
+        if self._timer is not None:
+            try:
+                sys.meta_path.remove(self._timer)
+            except ValueError:
+                pass
+            self._timer = None
+
+    def mark(self, phase: str) -> None:
+        self.phases[phase] = time.perf_counter() - self.t0
+
+    def request_finished(self) -> None:
+        if self.first_request is not None:
+            return
+        self.first_request = time.perf_counter() - self.t0
+        # Startup is over; stop wrapping loaders for late imports.
+        self._remove_import_timer()
+        logger.info("Startup profile: %s", json.dumps(self.report()))
+
+    def report(self) -> dict:
+        return {
+            "phases": {k: round(v, 4) for k, v in self.phases.items()},
+            "first_request_seconds": None if self.first_request is None else round(self.first_request, 4),
+            "imports": {k: round(v, 4) for k, v in sorted(self.imports.items(), key=lambda kv: -kv[1])},
+        }
+
+    def phase_samples(self):
+        for phase, seconds in self.phases.items():
+            yield (phase,), seconds
+        if self.first_request is not None:
+            yield ("first_request",), self.first_request
+
+    def import_samples(self):
+        for module, seconds in self.imports.items():
+            yield (module,), seconds
+
+
+startup_profile = StartupProfile()
@@ -0,0 +1,89 @@
+"""
+Song aggregates: per-artist and per-user counts and songs per hour.
+
+crud._record_inserted keeps them current in every insert transaction, so
+the /stats endpoints read a handful of rows instead of scanning
+song_entries. Run `python -m app.stats rebuild` (every silo, in multi-silo
+mode) after backfilling, or if the tables were ever edited by hand.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models
+
+logger = logging.getLogger(__name__)
+
+
+def _grouped(key):
+    return select(key, func.count(), func.max(models.SongEntry.created_at)).group_by(key)
+
+
+async def rebuild_stats(db: AsyncSession) -> int:
+    """Recompute every aggregate from song_entries. Returns the number of songs counted."""
+    if db.bind.dialect.name == "postgresql":
+        # Block inserts (they'd update the tables we're replacing) but not reads.
+        await db.execute(text(f"LOCK TABLE {models.SongEntry.__tablename__} IN SHARE MODE"))
+
+    for model in (models.ArtistStat, models.UserStat, models.HourlyActivity):
+        await db.execute(delete(model))
+
+    await db.execute(
+        insert(models.ArtistStat).from_select(
+            ["artist", "song_count", "last_added_at"], _grouped(models.SongEntry.artist)
+        )
+    )
+    await db.execute(
+        insert(models.UserStat).from_select(
+            ["user", "song_count", "last_added_at"], _grouped(models.SongEntry.user)
+        )
+    )
+
+    # Truncating to the hour is spelled differently on every backend, so
+    # bucket in Python; only created_at is streamed.
+    hours: Counter = Counter()
+    result = await db.stream_scalars(select(models.SongEntry.created_at).execution_options(yield_per=5000))
+    async for created_at in result:
+        hours[models.hour_bucket(created_at)] += 1
+    if hours:
+        await db.execute(
+            insert(models.HourlyActivity),
+            [{"hour": hour, "song_count": n} for hour, n in sorted(hours.items())],
+        )
+
+    await crud.bump_feed_version(db)
+    await db.commit()
+    return sum(hours.values())
+
+
+async def _main() -> None:
+    from .database import get_engine, make_engine, make_session_factory
+    from .settings import SILOS_FILE
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.stats rebuild")
+
+    if not SILOS_FILE:
+        engines = {"default": get_engine()}
+    else:
+        from .silos import load_silo_specs
+
+        engines = {spec.id: make_engine(spec.database_url, pool_size=1, max_overflow=0) for spec in load_silo_specs(SILOS_FILE)}
+    for name, engine in engines.items():
+        try:
+            async with make_session_factory(engine)() as db:
+                counted = await rebuild_stats(db)
+            logger.info("%s: rebuilt stats over %d songs", name, counted)
+        finally:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+from .config_cache import ConfigCache, config_cache
+from .database import SessionLocal
+from .settings import TOKEN_REFRESH_MARGIN_SECONDS, TOKEN_REFRESH_RETRY_SECONDS
+from .spotify_client import SpotifyAuthError, refresh_access_token_async
+
+logger = logging.getLogger(__name__)
+
+# Never hand out a token that expires sooner than this.
+MIN_TOKEN_TTL = timedelta(seconds=60)
+# How long one worker may spend refreshing before another takes over; well
+# past the Spotify client's 10s timeout.
+REFRESH_LEASE = timedelta(seconds=30)
+REFRESH_LEASE_POLL_SECONDS = 0.2
+
+
+def _as_utc(dt: datetime | None) -> datetime | None:
+    # SQLite hands back naive datetimes even for DateTime(timezone=True).
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class TokenManager:
+    """
+    Process-wide cache of the Spotify access token.
+
+    Requests read the token from memory. Refreshes are single-flight within
+    the process (asyncio lock) and across workers (a lease on the
+    playlist_config row), and a background task refreshes ahead of expiry.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        config_cache: ConfigCache,
+        refresh_margin: timedelta,
+        retry_delay: float,
+    ):
+        self._session_factory = session_factory
+        self._config_cache = config_cache
+        self._refresh_margin = refresh_margin
+        self._retry_delay = retry_delay
+        self._access_token: str | None = None
+        self._expires_at: datetime | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def _cached(self, min_ttl: timedelta) -> str | None:
+        if self._access_token and self._expires_at:
+            if self._expires_at - datetime.now(timezone.utc) > min_ttl:
+                return self._access_token
+        return None
+
+    def prime(self, access_token: str, expires_at: datetime) -> None:
+        """Seed the cache after the admin OAuth flow stored fresh tokens."""
+        self._access_token = access_token
+        self._expires_at = _as_utc(expires_at)
+
+    def invalidate(self) -> None:
+        self._access_token = None
+        self._expires_at = None
+
+    async def get_access_token(self) -> str:
+        token = self._cached(MIN_TOKEN_TTL)
+        if token is not None:
+            return token
+
+        async with self._lock:
+            token = self._cached(MIN_TOKEN_TTL)
+            if token is not None:
+                return token
+            return await self._refresh(min_ttl=MIN_TOKEN_TTL)
+
+    @staticmethod
+    async def _claim_refresh(
+        db: AsyncSession, min_ttl: timedelta, owner: str
+    ) -> tuple[models.PlaylistConfig, bool] | None:
+        """
+        One short transaction. Returns (config row, False) if it holds a
+        token good for `min_ttl`, (config row, True) if we just took the
+        refresh lease, or None while another worker holds it.
+        """
+        cfg = await db.scalar(select(models.PlaylistConfig).order_by(models.PlaylistConfig.id).limit(1))
+        if cfg is None or not cfg.spotify_refresh_token:
+            raise SpotifyAuthError("No refresh token stored")
+
+        now = datetime.now(timezone.utc)
+        expires_at = _as_utc(cfg.spotify_access_token_expires_at)
+        if cfg.spotify_access_token and expires_at and expires_at - now > min_ttl:
+            # Another worker refreshed since our cache went stale.
+            return cfg, False
+
+        # Conditional UPDATE, so only one worker gets the lease; it lapses in
+        # case that worker dies mid-refresh.
+        lease = models.PlaylistConfig.spotify_refresh_lease_expires_at
+        claimed = await db.execute(
+            update(models.PlaylistConfig)
+            .where(models.PlaylistConfig.id == cfg.id, or_(lease.is_(None), lease < now))
+            .values(spotify_refresh_lease_owner=owner, spotify_refresh_lease_expires_at=now + REFRESH_LEASE)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return (cfg, True) if claimed.rowcount == 1 else None
+
+    async def _update_leased(self, owner: str, **values) -> bool:
+        """Write to the config row and end our lease, unless it has lapsed and been taken."""
+        async with self._session_factory() as db:
+            result = await db.execute(
+                update(models.PlaylistConfig)
+                .where(models.PlaylistConfig.spotify_refresh_lease_owner == owner)
+                .values(spotify_refresh_lease_owner=None, spotify_refresh_lease_expires_at=None, **values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _refresh(self, min_ttl: timedelta) -> str:
+        # No database lock is held across the call to Spotify: one worker
+        # takes a lease in a short transaction and stores the new token in a
+        # second one; the others poll until it appears (or the lease lapses
+        # and one of them takes over).
+        owner = uuid.uuid4().hex
+        while True:
+            async with self._session_factory() as db:
+                claim = await self._claim_refresh(db, min_ttl, owner)
+            if claim is not None:
+                break
+            await asyncio.sleep(REFRESH_LEASE_POLL_SECONDS)
+
+        cfg, leased = claim
+        if not leased:
+            access_token = cfg.spotify_access_token
+            expires_at = _as_utc(cfg.spotify_access_token_expires_at)
+        else:
+            try:
+                token_data = await refresh_access_token_async(cfg.spotify_refresh_token)
+                access_token = token_data.get("access_token")
+                if not access_token:
+                    raise SpotifyAuthError("Refresh response missing access_token")
+            except BaseException:
+                # Let the next caller, here or in another worker, retry right away.
+                await self._update_leased(owner)
+                raise
+
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=int(token_data.get("expires_in", 3600)))
+            values = {
+                "spotify_access_token": access_token,
+                "spotify_access_token_expires_at": expires_at,
+                "version": models.PlaylistConfig.version + 1,
+            }
+            # Spotify may rotate the refresh token.
+            if token_data.get("refresh_token"):
+                values["spotify_refresh_token"] = token_data["refresh_token"]
+            if not await self._update_leased(owner, **values):
+                # The lease lapsed and another worker took over; its token
+                # wins in the database, ours is still good for this process.
+                logger.warning("Token refresh lease lapsed before the new token was stored")
+            self._config_cache.invalidate()
+
+        self._access_token = access_token
+        self._expires_at = expires_at
+        return access_token
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._lock:
+                    if self._cached(self._refresh_margin) is None:
+                        await self._refresh(min_ttl=self._refresh_margin)
+                remaining = self._expires_at - datetime.now(timezone.utc) - self._refresh_margin
+                delay = max(remaining.total_seconds(), self._retry_delay)
+            except SpotifyAuthError as e:
+                # Not connected yet, or Spotify rejected the refresh.
+                logger.debug("Proactive token refresh skipped: %s", e)
+                delay = self._retry_delay
+            except Exception:
+                logger.exception("Proactive token refresh failed")
+                delay = self._retry_delay
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+token_manager = TokenManager(
+    SessionLocal,
+    config_cache,
+    refresh_margin=timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS),
+    retry_delay=TOKEN_REFRESH_RETRY_SECONDS,
+)
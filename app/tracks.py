@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models
+from .settings import TRACK_CACHE_MAX_ENTRIES
+from .spotify_client import SpotifyApiError, SpotifyAuthError
+
+logger = logging.getLogger(__name__)
+
+# Spotify ids are base62; anything else would fail a whole /tracks batch.
+_TRACK_ID_RE = re.compile(r"[0-9A-Za-z]+")
+
+TrackFetcher = Callable[[list[str]], Awaitable[list[dict | None]]]
+
+
+class UnknownTrackError(ValueError):
+    def __init__(self, track_ids: list[str]):
+        super().__init__(f"Unknown Spotify track: {', '.join(track_ids)}")
+        self.track_ids = track_ids
+
+
+@dataclass(frozen=True, slots=True)
+class TrackInfo:
+    spotify_track_id: str
+    spotify_track_uri: str
+    name: str
+    artist: str
+    album_art_url: str | None
+    duration_ms: int | None
+
+
+def track_from_api(item: dict | None) -> TrackInfo | None:
+    """TrackInfo from a Spotify track object (search item or /tracks entry)."""
+    if not item or not item.get("id"):
+        return None
+    images = (item.get("album") or {}).get("images") or []
+    return TrackInfo(
+        spotify_track_id=item["id"],
+        spotify_track_uri=item.get("uri") or f"spotify:track:{item['id']}",
+        name=item.get("name") or "",
+        artist=", ".join(a["name"] for a in item.get("artists") or () if a.get("name")),
+        # Spotify lists album images largest first.
+        album_art_url=images[0].get("url") if images else None,
+        duration_ms=item.get("duration_ms"),
+    )
+
+
+# /spotify/search?fields= extras, on top of id, uri, name, artists and image.
+SEARCH_EXTRA_FIELDS = frozenset({"album", "duration_ms", "explicit", "popularity", "preview_url", "external_url", "images"})
+# Typeahead rows show a thumbnail; pick the smallest image at least this wide.
+SEARCH_IMAGE_MIN_WIDTH = 64
+
+
+def _search_image(images: list[dict]) -> str | None:
+    if not images:
+        return None
+    wide_enough = [img for img in images if (img.get("width") or 0) >= SEARCH_IMAGE_MIN_WIDTH]
+    if not wide_enough:
+        return images[0].get("url")
+    return min(wide_enough, key=lambda img: img["width"]).get("url")
+
+
+def slim_track(item: dict, extra_fields: frozenset[str] = frozenset()) -> dict:
+    """The parts of a Spotify track object the frontend uses (see schemas.SlimTrack)."""
+    album = item.get("album") or {}
+    images = album.get("images") or []
+    track = {
+        "id": item.get("id"),
+        "uri": item.get("uri"),
+        "name": item.get("name"),
+        "artists": [a.get("name") for a in item.get("artists") or ()],
+        "image": _search_image(images),
+    }
+    for field in extra_fields:
+        if field == "album":
+            track["album"] = album.get("name")
+        elif field == "external_url":
+            track["external_url"] = (item.get("external_urls") or {}).get("spotify")
+        elif field == "images":
+            track["images"] = [img.get("url") for img in images]
+        else:
+            track[field] = item.get(field)
+    return track
+
+
+def slim_search_result(result: dict, extra_fields: frozenset[str] = frozenset()) -> dict:
+    tracks = result.get("tracks") or {}
+    return {
+        "items": [slim_track(item, extra_fields) for item in tracks.get("items") or () if item],
+        "total": tracks.get("total"),
+    }
+
+
+def _from_row(row: models.Track) -> TrackInfo:
+    return TrackInfo(
+        spotify_track_id=row.spotify_track_id,
+        spotify_track_uri=row.spotify_track_uri,
+        name=row.name,
+        artist=row.artist,
+        album_art_url=row.album_art_url,
+        duration_ms=row.duration_ms,
+    )
+
+
+class TrackCatalog:
+    """
+    Spotify track metadata: an in-process LRU in front of the silo's `tracks`
+    table, in front of Spotify's /tracks endpoint.
+
+    Every search response is stored, so a track picked from search results is
+    already known when it's submitted. Metadata is the same for every silo,
+    so the LRU is shared; the table is per silo database.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, TrackInfo] = OrderedDict()
+
+        self.hits = 0
+        self.db_hits = 0
+        self.fetched = 0
+        self.unknown = 0
+
+    def _remember(self, info: TrackInfo) -> None:
+        self._entries[info.spotify_track_id] = info
+        self._entries.move_to_end(info.spotify_track_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def store(self, db: AsyncSession, items: list[dict | None]) -> list[TrackInfo]:
+        """Remember the tracks in a Spotify API response; returns them parsed."""
+        infos = [info for info in map(track_from_api, items) if info is not None]
+        # Skip the write for tracks we already hold unchanged.
+        changed = {info.spotify_track_id: info for info in infos if self._entries.get(info.spotify_track_id) != info}
+        for info in infos:
+            self._remember(info)
+        if changed:
+            now = models.utcnow()
+            try:
+                await crud.upsert_tracks(db, [{**asdict(info), "fetched_at": now} for info in changed.values()])
+            except SQLAlchemyError as e:
+                # Only a cache write; the caller's request goes on without it.
+                await db.rollback()
+                logger.warning("Storing %d tracks failed: %s", len(changed), e)
+        return infos
+
+    async def resolve(
+        self, db: AsyncSession, track_ids: list[str], fetch: TrackFetcher | None = None
+    ) -> tuple[dict[str, TrackInfo], list[str]]:
+        """
+        Metadata for `track_ids` from memory, then the tracks table, then
+        Spotify (if `fetch` is given) in batches of 50.
+
+        Returns (found, unknown). `unknown` only lists ids that can't exist on
+        Spotify; ids we couldn't check (no fetcher, Spotify unavailable) are
+        in neither.
+        """
+        found: dict[str, TrackInfo] = {}
+        unknown: list[str] = []
+        missing: list[str] = []
+        for track_id in dict.fromkeys(track_ids):
+            info = self._entries.get(track_id)
+            if info is not None:
+                self._entries.move_to_end(track_id)
+                found[track_id] = info
+                self.hits += 1
+            elif not _TRACK_ID_RE.fullmatch(track_id):
+                unknown.append(track_id)
+            else:
+                missing.append(track_id)
+
+        if missing:
+            for row in await crud.get_tracks(db, missing):
+                info = _from_row(row)
+                self._remember(info)
+                found[info.spotify_track_id] = info
+                self.db_hits += 1
+            missing = [track_id for track_id in missing if track_id not in found]
+
+        if missing and fetch is not None:
+            try:
+                items = await fetch(missing)
+            except (SpotifyApiError, SpotifyAuthError) as e:
+                logger.warning("Track lookup failed for %d ids: %s", len(missing), e)
+            else:
+                self.fetched += len(missing)
+                for info in await self.store(db, items):
+                    found[info.spotify_track_id] = info
+                # /tracks answers null for ids it doesn't know.
+                unknown.extend(track_id for track_id in missing if track_id not in found)
+
+        self.unknown += len(unknown)
+        return found, unknown
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "fetched": self.fetched,
+            "unknown": self.unknown,
+        }
+
+
+track_catalog = TrackCatalog(max_entries=TRACK_CACHE_MAX_ENTRIES)
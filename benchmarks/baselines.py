@@ -0,0 +1,34 @@
+"""
+ORM versions of the /songs and feed queries, as they were before the app
+moved them to Core rows and prebuilt statements. The benchmarks measure the
+app's code against these; nothing in app/ uses them.
+"""
+from __future__ import annotations
+
+from sqlalchemy import select
+
+from app import models
+
+
+def _songs_page_stmt(limit: int, *entities):
+    return (
+        select(*entities)
+        .order_by(models.SongEntry.created_at.desc(), models.SongEntry.id.desc())
+        .limit(limit)
+    )
+
+
+async def list_songs(db) -> list[models.SongEntry]:
+    stmt = select(models.SongEntry).order_by(models.SongEntry.created_at.desc())
+    return list(await db.scalars(stmt))
+
+
+async def list_song_rows_page(db, columns: tuple[str, ...], limit: int) -> list:
+    """First /songs page, selecting ORM attributes through the session."""
+    stmt = _songs_page_stmt(limit, *(getattr(models.SongEntry, c) for c in columns))
+    return list(await db.execute(stmt))
+
+
+async def get_feed_version(db) -> int:
+    version = await db.scalar(select(models.FeedState.version).where(models.FeedState.id == models.FEED_STATE_ID))
+    return version or 0
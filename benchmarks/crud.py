@@ -0,0 +1,159 @@
+"""
+Per-call overhead of the hot CRUD queries: the ORM versions (statement built
+per call, ORM entities back; see benchmarks.baselines) against crud's
+prebuilt-statement versions (Table columns, plain rows).
+
+    python -m benchmarks.crud --calls 2000 --out crud.json
+
+Runs against a fresh temporary SQLite database seeded with `--rows` songs.
+Every query runs `--calls` times in one session, `--repeat` rounds, best
+round counts; both versions must return the same values. The seeding deletes
+every song entry, so a real database is only used when named with
+--database-url, never picked up from $DATABASE_URL.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmarks.load import _configure_env, _git_rev, _temp_database_url
+from benchmarks.serialize import _seed
+
+PAGE_SIZE = 50
+
+
+# ---------- before: the ORM versions ----------
+
+async def _orm_feed_version(db):
+    from benchmarks.baselines import get_feed_version
+
+    return await get_feed_version(db)
+
+
+async def _orm_playlist_config(db):
+    from app import crud
+
+    cfg = await crud.get_playlist_config(db)
+    return (cfg.id, cfg.version, cfg.spotify_playlist_id, cfg.name)
+
+
+async def _orm_songs_page(db):
+    from app.main import SONG_COLUMNS
+    from benchmarks.baselines import list_song_rows_page
+
+    return [tuple(row) for row in await list_song_rows_page(db, SONG_COLUMNS, PAGE_SIZE)]
+
+
+# ---------- after: prebuilt statements ----------
+
+async def _core_feed_version(db):
+    from app import crud
+
+    return await crud.get_feed_version(db)
+
+
+async def _core_playlist_config(db):
+    from app import crud
+
+    row = await crud.get_playlist_config_row(db)
+    return (row.id, row.version, row.spotify_playlist_id, row.name)
+
+
+async def _core_songs_page(db):
+    from app import crud
+    from app.main import SONG_COLUMNS
+
+    return [tuple(row) for row in await crud.list_song_rows_page(db, SONG_COLUMNS, PAGE_SIZE)]
+
+
+QUERIES = {
+    "feed_version": (_orm_feed_version, _core_feed_version),
+    "playlist_config": (_orm_playlist_config, _core_playlist_config),
+    "songs_page": (_orm_songs_page, _core_songs_page),
+}
+
+
+async def _per_call(session_factory, fn, calls: int, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        async with session_factory() as db:
+            result = await fn(db)  # warm-up: connection, compiled cache
+            start = time.perf_counter()
+            for _ in range(calls):
+                await fn(db)
+            best = min(best, (time.perf_counter() - start) / calls)
+    return best, result
+
+
+async def run(args) -> dict:
+    from sqlalchemy import delete
+
+    from app import models
+    from app.database import SessionLocal, get_engine
+    from app.schema import ensure_schema
+
+    engine = get_engine()
+    await ensure_schema(engine)
+    results = []
+    try:
+        await _seed(SessionLocal, args.rows)
+        async with SessionLocal() as db:
+            await db.execute(delete(models.PlaylistConfig))
+            db.add(models.PlaylistConfig(spotify_playlist_id="bench", name="Bench"))
+            await db.commit()
+
+        for name, (before, after) in QUERIES.items():
+            before_s, before_result = await _per_call(SessionLocal, before, args.calls, args.repeat)
+            after_s, after_result = await _per_call(SessionLocal, after, args.calls, args.repeat)
+            if before_result != after_result:
+                raise SystemExit(f"{name}: prebuilt version returns {after_result!r}, ORM version {before_result!r}")
+            results.append({
+                "query": name,
+                "before_us": round(before_s * 1e6, 1),
+                "after_us": round(after_s * 1e6, 1),
+                "speedup": round(before_s / after_s, 2),
+            })
+    finally:
+        await engine.dispose()
+
+    return {
+        "results": results,
+        "config": {
+            "rows": args.rows,
+            "calls": args.calls,
+            "repeat": args.repeat,
+            "page_size": PAGE_SIZE,
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "python": platform.python_version(),
+            "git_rev": _git_rev(),
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--database-url", help="database to empty and seed (default: a temp SQLite file; $DATABASE_URL is ignored)"
+    )
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    _configure_env(args.database_url or _temp_database_url())
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from collections import Counter
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class FakeSpotify:
+    """
+    Local stand-in for accounts.spotify.com and api.spotify.com, served as an
+    ASGI app so it can sit behind httpx.ASGITransport.
+
+    Every endpoint waits `latency` (+/- `jitter`) seconds and answers 429 with
+    probability `rate_429`.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, rate_429: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.throttled: Counter[str] = Counter()
+        self.playlist_uris: list[str] = []
+        self.app = Starlette(routes=[
+            Route("/api/token", self.token, methods=["POST"]),
+            Route("/v1/search", self.search, methods=["GET"]),
+            Route("/v1/tracks", self.tracks, methods=["GET"]),
+            Route("/v1/playlists/{playlist_id}", self.playlist, methods=["GET"]),
+            Route("/v1/playlists/{playlist_id}/tracks", self.playlist_tracks, methods=["GET", "POST"]),
+        ])
+
+    async def _delay(self, name: str) -> JSONResponse | None:
+        self.calls[name] += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if self.rate_429 and random.random() < self.rate_429:
+            self.throttled[name] += 1
+            return JSONResponse(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status_code=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        return None
+
+    @staticmethod
+    def _track(track_id: str, name: str) -> dict:
+        return {
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "name": name,
+            "duration_ms": 200000,
+            "explicit": False,
+            "popularity": random.randint(0, 100),
+            "preview_url": None,
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+            "available_markets": ["US", "GB", "DE", "FR", "SE", "JP", "BR", "CA", "AU", "NL"] * 8,
+            "artists": [{
+                "id": f"artist{track_id[:4]}",
+                "name": f"Artist {track_id[:4]}",
+                "uri": f"spotify:artist:artist{track_id[:4]}",
+                "external_urls": {"spotify": "https://open.spotify.com/artist/x"},
+            }],
+            "album": {
+                "id": f"album{track_id[:4]}",
+                "name": f"Album {track_id[:4]}",
+                "release_date": "2020-01-01",
+                "available_markets": ["US", "GB", "DE", "FR", "SE", "JP", "BR", "CA", "AU", "NL"] * 8,
+                "images": [
+                    {"url": f"https://i.scdn.co/image/{track_id}-{size}", "height": size, "width": size}
+                    for size in (640, 300, 64)
+                ],
+            },
+        }
+
+    async def token(self, request: Request):
+        if (resp := await self._delay("token")) is not None:
+            return resp
+        return JSONResponse({"access_token": "fake-access-token", "token_type": "Bearer", "expires_in": 3600})
+
+    async def search(self, request: Request):
+        if (resp := await self._delay("search")) is not None:
+            return resp
+        query = request.query_params.get("q", "")
+        limit = int(request.query_params.get("limit", "10"))
+        items = [self._track(f"{abs(hash((query, i))) % 10**12:012d}", f"{query} {i}") for i in range(limit)]
+        return JSONResponse({"tracks": {"href": "", "items": items, "limit": limit, "offset": 0, "total": 1000}})
+
+    async def tracks(self, request: Request):
+        if (resp := await self._delay("tracks")) is not None:
+            return resp
+        ids = [i for i in request.query_params.get("ids", "").split(",") if i]
+        return JSONResponse({"tracks": [self._track(i, f"Track {i}") for i in ids]})
+
+    async def playlist(self, request: Request):
+        if (resp := await self._delay("playlist")) is not None:
+            return resp
+        return JSONResponse({
+            "id": request.path_params["playlist_id"],
+            "snapshot_id": f"snap-{len(self.playlist_uris)}",
+            "tracks": {"total": len(self.playlist_uris)},
+        })
+
+    async def playlist_tracks(self, request: Request):
+        if request.method == "GET":
+            if (resp := await self._delay("playlist_items")) is not None:
+                return resp
+            offset = int(request.query_params.get("offset", "0"))
+            limit = int(request.query_params.get("limit", "100"))
+            page = self.playlist_uris[offset:offset + limit]
+            return JSONResponse({
+                "items": [{"track": {"uri": uri, "id": uri.rsplit(":", 1)[-1]}} for uri in page],
+                "total": len(self.playlist_uris),
+                "next": None if offset + limit >= len(self.playlist_uris) else "more",
+            })
+
+        if (resp := await self._delay("add_tracks")) is not None:
+            return resp
+        body = await request.json()
+        self.playlist_uris.extend(body.get("uris", []))
+        return JSONResponse({"snapshot_id": f"snap-{len(self.playlist_uris)}"}, status_code=201)
@@ -0,0 +1,242 @@
+"""
+Mixed-workload load test for app.main against a local fake Spotify.
+
+    python -m benchmarks.load --duration 30 --clients 50 --out bench.json
+
+Runs in-process: the app is driven through httpx.ASGITransport and its
+Spotify client is pointed at benchmarks.fake_spotify. DATABASE_URL selects the
+database (default: a throwaway SQLite file), so the same command benchmarks a
+local Postgres too. Prints per-endpoint throughput and p50/p95/p99 as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+
+def _temp_database_url() -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix="spotifind-bench-"), "bench.db")
+    return f"sqlite:///{path}"
+
+
+def _configure_env(database_url: str | None) -> None:
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    elif "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = _temp_database_url()
+    for key, value in {
+        "ADMIN_USERNAME": "bench",
+        "ADMIN_PASSWORD": "bench",
+        "ADMIN_JWT_SECRET": "bench-secret-bench-secret-bench-secret",
+        "SPOTIFY_CLIENT_ID": "bench",
+        "SPOTIFY_CLIENT_SECRET": "bench",
+        "SPOTIFY_REDIRECT_URI": "http://localhost/callback",
+        "SPOTIFY_SCOPES": "playlist-modify-private",
+        "FRONTEND_ADMIN_URL": "http://localhost/admin",
+        "FRONTEND_ORIGIN": "http://localhost",
+        "IMAGE_PROXY_BASE_URL": "http://localhost",
+    }.items():
+        os.environ.setdefault(key, value)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, status: int, elapsed: float) -> None:
+        self.latencies[name].append(elapsed)
+        self.statuses[name][status] += 1
+
+    def report(self, duration: float) -> dict:
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            errors = sum(n for status, n in self.statuses[name].items() if status >= 500)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+                "statuses": dict(sorted(self.statuses[name].items())),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {"duration_s": round(duration, 3), "total_requests": total, "rps": round(total / duration, 2), "endpoints": endpoints}
+
+
+# A small vocabulary with a skewed (Zipf-like) popularity, like real typeahead.
+QUERIES = [
+    "daft punk", "taylor swift", "beyonce", "radiohead", "kendrick lamar", "the beatles",
+    "fleetwood mac", "bad bunny", "drake", "billie eilish", "arctic monkeys", "rosalia",
+    "frank ocean", "sza", "tame impala", "phoebe bridgers", "bon iver", "lorde",
+]
+QUERY_WEIGHTS = [1 / (rank + 1) for rank in range(len(QUERIES))]
+
+
+async def typeahead(client, rec: Recorder, rng: random.Random) -> None:
+    query = rng.choices(QUERIES, QUERY_WEIGHTS)[0]
+    # Type it out a few characters at a time, as the frontend would.
+    for end in range(3, len(query) + 1, 2):
+        start = time.perf_counter()
+        resp = await client.get("/spotify/search", params={"q": query[:end], "limit": 10})
+        rec.record("GET /spotify/search", resp.status_code, time.perf_counter() - start)
+
+
+def _song(rng: random.Random, user: str) -> dict:
+    track_id = "".join(rng.choices(string.ascii_letters + string.digits, k=22))
+    return {
+        "spotify_track_id": track_id,
+        "spotify_track_uri": f"spotify:track:{track_id}",
+        "song": f"Song {track_id[:6]}",
+        "artist": rng.choice(QUERIES).title(),
+        "album_art_url": f"https://i.scdn.co/image/{track_id}",
+        "user": user,
+        "user_avatar_url": None,
+        "comment": rng.choice([None, "banger", "for the road trip", "obsessed"]),
+    }
+
+
+async def submit_burst(client, rec: Recorder, rng: random.Random, burst: int) -> None:
+    user = f"user{rng.randint(1, 500)}"
+    for _ in range(burst):
+        start = time.perf_counter()
+        resp = await client.post("/songs", json=_song(rng, user))
+        rec.record("POST /songs", resp.status_code, time.perf_counter() - start)
+
+
+async def poll(client, rec: Recorder, etags: dict) -> None:
+    headers = {"If-None-Match": etags["songs"]} if etags.get("songs") else {}
+    start = time.perf_counter()
+    resp = await client.get("/songs", headers=headers)
+    rec.record("GET /songs", resp.status_code, time.perf_counter() - start)
+    if resp.headers.get("etag"):
+        etags["songs"] = resp.headers["etag"]
+
+
+async def virtual_client(client, rec: Recorder, deadline: float, seed: int, weights: dict, burst: int) -> None:
+    rng = random.Random(seed)
+    etags: dict = {}
+    kinds, kind_weights = zip(*weights.items())
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, kind_weights)[0]
+        if kind == "search":
+            await typeahead(client, rec, rng)
+        elif kind == "submit":
+            await submit_burst(client, rec, rng, burst)
+        else:
+            await poll(client, rec, etags)
+
+
+async def seed_config() -> None:
+    from app import models
+    from app.database import SessionLocal
+    from app.config_cache import config_cache
+
+    async with SessionLocal() as db:
+        cfg = models.PlaylistConfig(spotify_refresh_token="fake-refresh-token", spotify_playlist_id="benchplaylist")
+        db.add(cfg)
+        await db.commit()
+    config_cache.invalidate()
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from benchmarks.fake_spotify import FakeSpotify
+
+    fake = FakeSpotify(latency=args.spotify_latency_ms / 1000, jitter=args.spotify_jitter_ms / 1000, rate_429=args.spotify_429_rate)
+
+    from app import spotify_client
+    from app.metrics import InstrumentedAsyncTransport
+
+    spotify_client._build_http_client = lambda: httpx.AsyncClient(
+        transport=InstrumentedAsyncTransport(httpx.ASGITransport(app=fake.app)), timeout=10
+    )
+
+    from app.main import app
+
+    rec = Recorder()
+    weights = {"search": args.search_weight, "submit": args.submit_weight, "poll": args.poll_weight}
+    async with app.router.lifespan_context(app):
+        await seed_config()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                virtual_client(client, rec, deadline, args.seed + i, weights, args.burst)
+                for i in range(args.clients)
+            ))
+            elapsed = time.perf_counter() - started
+
+    report = rec.report(elapsed)
+    report["spotify"] = {"calls": dict(fake.calls), "throttled": dict(fake.throttled)}
+    report["config"] = {
+        "clients": args.clients,
+        "duration_s": args.duration,
+        "weights": weights,
+        "burst": args.burst,
+        "spotify_latency_ms": args.spotify_latency_ms,
+        "spotify_429_rate": args.spotify_429_rate,
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "python": platform.python_version(),
+        "git_rev": _git_rev(),
+    }
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent virtual clients")
+    parser.add_argument("--database-url", help="defaults to $DATABASE_URL or a temp SQLite file")
+    parser.add_argument("--search-weight", type=float, default=5.0)
+    parser.add_argument("--submit-weight", type=float, default=1.0)
+    parser.add_argument("--poll-weight", type=float, default=10.0)
+    parser.add_argument("--burst", type=int, default=5, help="songs per submission burst")
+    parser.add_argument("--spotify-latency-ms", type=float, default=50.0)
+    parser.add_argument("--spotify-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--spotify-429-rate", type=float, default=0.0, help="probability of a 429 per Spotify call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    _configure_env(args.database_url)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
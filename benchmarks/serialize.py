@@ -0,0 +1,151 @@
+"""
+Micro-benchmark for the /songs body: the ORM + SongOut path against the
+Core-row + fast-encoder path in app.main._build_songs_page.
+
+    python -m benchmarks.serialize --rows 1000 10000 100000 --out ser.json
+
+Runs against a temporary SQLite database, reseeded for each size; the full
+list (?all=true) is built `--repeat` times per path and the best time counts.
+Both paths must produce the same JSON. The seeding deletes every song
+entry, so a real database is only used when named with --database-url, never
+picked up from $DATABASE_URL.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmarks.load import _configure_env, _git_rev, _temp_database_url
+
+
+async def _seed(session_factory, n: int) -> None:
+    from sqlalchemy import delete, insert
+
+    from app import models
+
+    now = models.utcnow()
+    async with session_factory() as db:
+        await db.execute(delete(models.SongEntry))
+        for start in range(0, n, 5000):
+            await db.execute(insert(models.SongEntry), [
+                {
+                    "spotify_track_id": f"track{i:07d}",
+                    "spotify_track_uri": f"spotify:track:track{i:07d}",
+                    "song": f"Song {i}",
+                    "artist": f"Artist {i % 500}",
+                    "album_art_url": f"https://i.scdn.co/image/{i:07d}",
+                    "user": f"user{i % 300}",
+                    "user_avatar_url": None,
+                    "comment": "for the road trip" if i % 3 == 0 else None,
+                    "created_at": now,
+                }
+                for i in range(start, min(start + 5000, n))
+            ])
+        await db.commit()
+
+
+@functools.cache
+def _song_list():
+    from pydantic import TypeAdapter
+
+    from app import schemas
+
+    return TypeAdapter(list[schemas.SongOut])
+
+
+async def _orm_path(db) -> bytes:
+    from benchmarks.baselines import list_songs
+
+    songs = _song_list()
+    return songs.dump_json(songs.validate_python(await list_songs(db), from_attributes=True))
+
+
+async def _core_path(db, fields) -> bytes:
+    from app.main import _build_songs_page
+
+    return await _build_songs_page(db, limit=0, cursor=None, since=None, all_=True, fields=fields)
+
+
+async def _best_of(repeat: int, session_factory, build) -> tuple[float, bytes]:
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        # A fresh session each time, as per request: no warm identity map.
+        async with session_factory() as db:
+            start = time.perf_counter()
+            body = await build(db)
+            best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+async def run(args) -> dict:
+    from app.database import SessionLocal, get_engine
+    from app.main import SONG_FIELDS
+    from app.schema import ensure_schema
+
+    engine = get_engine()
+    await ensure_schema(engine)
+    slim = ("id", "song", "artist", "created_at")
+    results = []
+    try:
+        for n in args.rows:
+            await _seed(SessionLocal, n)
+            orm_s, orm_body = await _best_of(args.repeat, SessionLocal, _orm_path)
+            core_s, core_body = await _best_of(args.repeat, SessionLocal, lambda db: _core_path(db, SONG_FIELDS))
+            slim_s, slim_body = await _best_of(args.repeat, SessionLocal, lambda db: _core_path(db, slim))
+
+            if json.loads(orm_body) != json.loads(core_body):
+                raise SystemExit(f"{n} rows: Core path output differs from the ORM path")
+            results.append({
+                "rows": n,
+                "orm_ms": round(orm_s * 1000, 2),
+                "core_ms": round(core_s * 1000, 2),
+                "speedup": round(orm_s / core_s, 2),
+                "core_projected_ms": round(slim_s * 1000, 2),
+                "body_bytes": len(core_body),
+                "projected_body_bytes": len(slim_body),
+            })
+    finally:
+        await engine.dispose()
+
+    from app import fastjson
+
+    return {
+        "results": results,
+        "config": {
+            "repeat": args.repeat,
+            "projected_fields": slim,
+            "encoder": "orjson" if fastjson.orjson is not None else "pydantic_core",
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "python": platform.python_version(),
+            "git_rev": _git_rev(),
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--database-url", help="database to empty and seed (default: a temp SQLite file; $DATABASE_URL is ignored)"
+    )
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    _configure_env(args.database_url or _temp_database_url())
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())